@@ -295,3 +295,13 @@ class ContractingClient:
 
     def set_var(self, contract, variable, arguments=[], value=None, mark=False):
         self.raw_driver.set_var(contract, variable, arguments, value, mark)
+
+    def iter_var(self, contract, variable, arguments=[], limit=0, start_after=None, mark=False):
+        # Pages through a hash without loading it whole. Yields (key, value) with the key relative to the arguments,
+        # so the last key yielded can be passed back as start_after.
+        prefix = self.raw_driver.make_key(contract, variable, arguments) + config.DELIMITER
+        if start_after is not None:
+            start_after = prefix + start_after
+
+        for k, v in self.raw_driver.iter(prefix=prefix, limit=limit, start_after=start_after, mark=mark):
+            yield k[len(prefix):], v
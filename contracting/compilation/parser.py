@@ -57,3 +57,21 @@ def variables_for_contract(contract_code: str):
         'variables': variables,
         'hashes': hashes
     }
+
+
+def dependencies_for_contract(contract_code: str):
+    tree = ast.parse(contract_code)
+
+    dependencies = set()
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for n in node.names:
+                dependencies.add(n.name)
+
+        # Dynamic imports can only be resolved ahead of time when the contract name is a literal
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'import_module':
+            if len(node.args) == 1 and isinstance(node.args[0], ast.Str):
+                dependencies.add(node.args[0].s)
+
+    return sorted(dependencies)
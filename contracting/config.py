@@ -1,6 +1,19 @@
 DB_OFFSET = 1
 NUM_CACHES = 4
 
+WRITE_BATCH_SIZE = 1000
+SQLITE_VARIABLE_LIMIT = 900
+LMDB_MAP_SIZE = 1024 * 1024 * 1024 * 16
+
+# Keys fetched from the backing driver per round trip by ContractDriver.iter
+ITER_PAGE_SIZE = 100
+
+# Byte budget of the cross-block read cache of CacheDriver. 0 disables it.
+READ_CACHE_SIZE = 0
+
+# Number of contract module instances kept between transactions by the DatabaseLoader.
+MODULE_CACHE_SIZE = 1024
+
 RECURSION_LIMIT = 1024
 
 DELIMITER = ':'
@@ -23,4 +36,8 @@ MAX_VALUE_SIZE = 32 * 1024
 READ_COST_PER_BYTE = 1
 WRITE_COST_PER_BYTE = 25
 
+# Charged for every hash computed by the hashlib bridge, in the same units as the costs above
+HASH_COST = 500
+HASH_COST_PER_BYTE = 2
+
 STAMPS_PER_TAU = 20
@@ -13,7 +13,7 @@ class Contract:
         self._driver = driver
 
     def submit(self, name, code, owner=None, constructor_args={}, developer=None):
-        if self._driver.get_contract(name) is not None:
+        if self._driver.contract_exists(name):
             raise Exception('Contract already exists.')
 
         c = ContractingCompiler(module_name=name)
@@ -21,7 +21,7 @@ class Contract:
         code_obj = c.parse_to_code(code, lint=True)
 
         scope = env.gather()
-        scope.update({'__contract__': True})
+        scope.update({'__contract__': True, '__name__': name})
         scope.update(rt.env)
 
         exec(code_obj, scope)
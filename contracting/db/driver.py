@@ -1,13 +1,28 @@
-from contracting.db.encoder import encode, decode, encode_kv
+from contracting.db.encoder import decode, encode_kv, encode_for_storage, CODEC_JSON
+from contracting.compilation.parser import dependencies_for_contract
 from contracting.execution.runtime import rt
-from contracting.stdlib.bridge.time import Datetime
+from contracting.execution.metrics import BYTES_ENCODED, BYTES_DECODED, CACHE_HITS, CACHE_MISSES, \
+    DRIVER_GET_SECONDS, DRIVER_SET_SECONDS
+from contracting.stdlib.bridge.time import Datetime, Timedelta
 from contracting.stdlib.bridge.decimal import ContractingDecimal
 from contracting import config
 from datetime import datetime
+from collections import OrderedDict
+from copy import deepcopy
+import bisect
+import heapq
+import hashlib
 import marshal
 import decimal
 import requests
+import sqlite3
 import pymongo
+from pymongo import UpdateOne, DeleteOne
+
+try:
+    import lmdb
+except ImportError:
+    lmdb = None
 
 # DB maps bytes to bytes
 # Driver maps string to python object
@@ -18,12 +33,33 @@ OWNER_KEY = '__owner__'
 TIME_KEY = '__submitted__'
 COMPILED_KEY = '__compiled__'
 DEVELOPER_KEY = '__developer__'
+DEPENDENCIES_KEY = '__dependencies__'
+MANIFEST_KEY = '__manifest__'
+
+
+def prefix_upper_bound(prefix: str):
+    # Smallest string greater than every string starting with prefix, or None if there is no such string
+    while len(prefix) > 0:
+        last = ord(prefix[-1])
+        if last < 0x10FFFF:
+            return prefix[:-1] + chr(last + 1)
+        prefix = prefix[:-1]
+    return None
 
 
 class Driver:
-    def __init__(self, db='lamden', collection='state'):
+    # Set to a metrics Registry to count the bytes encoded and decoded
+    metrics = None
+
+    # Most keys written, or rewritten by migrate_codec, in one batch. 0 means no limit. Drivers without batching of
+    # their own keep this default.
+    batch_size = config.WRITE_BATCH_SIZE
+
+    def __init__(self, db='lamden', collection='state', batch_size=config.WRITE_BATCH_SIZE, codec=CODEC_JSON):
         self.client = pymongo.MongoClient()
         self.db = self.client[db][collection]
+        self.batch_size = batch_size
+        self.codec = codec
 
     def get(self, item: str):
         v = self.db.find_one({'_id': item})
@@ -31,39 +67,96 @@ class Driver:
         if v is None:
             return None
 
-        return decode(v['v'])
+        return self._decode(v['v'])
+
+    def get_many(self, keys):
+        values = {k: None for k in keys}
+        for entry in self.db.find({'_id': {'$in': list(values.keys())}}):
+            values[entry['_id']] = self._decode(entry['v'])
+
+        return values
 
     def set(self, key, value):
         if value is None:
             self.__delitem__(key)
         else:
-            v = encode(value)
+            v = self._encode(value)
             self.db.update_one({'_id': key}, {'$set': {'v': v}}, upsert=True, )
 
+    def set_many(self, writes: dict):
+        # Sends all sets and deletes (None values) as unordered bulk writes of at most batch_size operations each
+        ops = []
+        for key, value in writes.items():
+            if value is None:
+                ops.append(DeleteOne({'_id': key}))
+            else:
+                ops.append(UpdateOne({'_id': key}, {'$set': {'v': self._encode(value)}}, upsert=True))
+
+            if 0 < self.batch_size <= len(ops):
+                self.db.bulk_write(ops, ordered=False)
+                ops = []
+
+        if len(ops) > 0:
+            self.db.bulk_write(ops, ordered=False)
+
+    def _decode(self, value):
+        if self.metrics is not None and value is not None:
+            self.metrics.counter(BYTES_DECODED).inc(len(value))
+        return decode(value)
+
+    def _encode(self, value, as_bytes=False):
+        v = encode_for_storage(value, self.codec, as_bytes=as_bytes)
+        if self.metrics is not None:
+            self.metrics.counter(BYTES_ENCODED).inc(len(v))
+        return v
+
+    def connection_args(self):
+        # How to open another driver on the same storage, for example in a worker process that can't share this
+        # driver's connection. None if the state only lives in this process.
+        return Driver, {'db': self.db.database.name, 'collection': self.db.name, 'batch_size': self.batch_size,
+                        'codec': self.codec}
+
     def flush(self):
         self.db.drop()
 
+    def migrate_codec(self, codec):
+        # Rewrites all existing state in the given codec. Values in either format can be read at any point, so this
+        # can be run on a live database.
+        self.codec = codec
+
+        # Values are read and rewritten in batches of the driver's own size. A batch size of 0 does it all at once.
+        keys = self.keys()
+        size = self.batch_size if self.batch_size > 0 else max(len(keys), 1)
+        for i in range(0, len(keys), size):
+            self.set_many(self.get_many(keys[i:i + size]))
+
     def delete(self, key: str):
         self.__delitem__(key)
 
-    def iter(self, prefix: str, length=0):
-        cur = self.db.find({'_id': {'$regex': f'^{prefix}'}})
+    def iter(self, prefix: str, length=0, start_after=None):
+        # Ordered range scan over the _id index instead of a regex match. Keys up to and including start_after are
+        # skipped, so a scan can be continued from the last key it returned.
+        key_range = {'$gte': prefix}
+        upper = prefix_upper_bound(prefix)
+        if upper is not None:
+            key_range['$lt'] = upper
+        if start_after is not None:
+            key_range['$gt'] = start_after
 
-        keys = []
-        for entry in cur:
-            keys.append(entry['_id'])
-            if 0 < length <= len(keys):
-                break
+        cur = self.db.find({'_id': key_range}, projection=['_id']).sort('_id', pymongo.ASCENDING).limit(length)
+
+        return [entry['_id'] for entry in cur]
 
-        keys.sort()
-        return keys
+    def delete_prefix(self, prefix: str):
+        key_range = {'$gte': prefix}
+        upper = prefix_upper_bound(prefix)
+        if upper is not None:
+            key_range['$lt'] = upper
+
+        self.db.delete_many({'_id': key_range})
 
     def keys(self):
-        k = []
-        for entry in self.db.find({}):
-            k.append(entry['_id'])
-        k.sort()
-        return k
+        return [entry['_id'] for entry in self.db.find({}, projection=['_id']).sort('_id', pymongo.ASCENDING)]
 
     def __getitem__(self, item: str):
         value = self.get(item)
@@ -79,43 +172,76 @@ class Driver:
 
 
 class InMemDriver(Driver):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, codec=CODEC_JSON):
+        super().__init__(codec=codec)
         self.db = {}
 
+        # Sorted index of the keys in db for ordered prefix scans
+        self.sorted_keys = []
+
     def get(self, item):
         key = item.encode()
         value = self.db.get(key)
-        return decode(value)
+        return self._decode(value)
+
+    def get_many(self, keys):
+        return {k: self.get(k) for k in keys}
 
     def set(self, key: str, value):
         k = key.encode()
         if value is None:
             self.__delitem__(key)
         else:
-            v = encode(value).encode()
+            v = self._encode(value, as_bytes=True)
+            if k not in self.db:
+                bisect.insort(self.sorted_keys, k)
             self.db[k] = v
 
+    def set_many(self, writes: dict):
+        for key, value in writes.items():
+            self.set(key, value)
+
     def delete(self, key: str):
         self.__delitem__(key)
 
-    def iter(self, prefix: str, length=0):
+    def iter(self, prefix: str, length=0, start_after=None):
         p = prefix.encode()
 
+        start = bisect.bisect_left(self.sorted_keys, p)
+        if start_after is not None:
+            start = max(start, bisect.bisect_right(self.sorted_keys, start_after.encode()))
+
         l = []
-        for k in sorted(self.db.keys()):
-            if k.startswith(p):
-                l.append(k.decode())
+        for i in range(start, len(self.sorted_keys)):
+            k = self.sorted_keys[i]
+            if not k.startswith(p):
+                break
+            l.append(k.decode())
             if 0 < length <= len(l):
                 break
 
         return l
 
+    def delete_prefix(self, prefix: str):
+        # Drops the range of the sorted index the prefix covers
+        start = bisect.bisect_left(self.sorted_keys, prefix.encode())
+
+        upper = prefix_upper_bound(prefix)
+        end = len(self.sorted_keys) if upper is None else bisect.bisect_left(self.sorted_keys, upper.encode())
+
+        for k in self.sorted_keys[start:end]:
+            del self.db[k]
+        del self.sorted_keys[start:end]
+
     def keys(self):
-        return sorted([k.decode() for k in self.db.keys()])
+        return [k.decode() for k in self.sorted_keys]
+
+    def connection_args(self):
+        return None
 
     def flush(self):
         self.db.clear()
+        self.sorted_keys.clear()
 
     def __getitem__(self, item: str):
         value = self.get(item)
@@ -131,7 +257,9 @@ class InMemDriver(Driver):
         try:
             del self.db[k]
         except KeyError:
-            pass
+            return
+
+        del self.sorted_keys[bisect.bisect_left(self.sorted_keys, k)]
 
 
 class WebDriver(InMemDriver):
@@ -152,24 +280,309 @@ class WebDriver(InMemDriver):
         return decode(r.json()['value'])
 
 
+class LMDBDriver(Driver):
+    # Embedded, memory-mapped and ordered storage. Requires the optional lmdb package.
+    def __init__(self, path='lamden.lmdb', map_size=config.LMDB_MAP_SIZE, codec=CODEC_JSON):
+        if lmdb is None:
+            raise ImportError('LMDBDriver requires the lmdb package.')
+
+        self.path = path
+        self.map_size = map_size
+        self.env = lmdb.open(path, map_size=map_size)
+        self.codec = codec
+
+    def get(self, item: str):
+        with self.env.begin() as txn:
+            return self._decode(txn.get(item.encode()))
+
+    def get_many(self, keys):
+        with self.env.begin() as txn:
+            return {k: self._decode(txn.get(k.encode())) for k in keys}
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, writes: dict):
+        # All writes are committed in a single transaction
+        with self.env.begin(write=True) as txn:
+            for key, value in writes.items():
+                if value is None:
+                    txn.delete(key.encode())
+                else:
+                    txn.put(key.encode(), self._encode(value, as_bytes=True))
+
+    def iter(self, prefix: str, length=0, start_after=None):
+        p = prefix.encode()
+        after = None if start_after is None else start_after.encode()
+
+        l = []
+        with self.env.begin() as txn:
+            cursor = txn.cursor()
+            if cursor.set_range(p if after is None else max(p, after)):
+                for k in cursor.iternext(values=False):
+                    if k == after:
+                        continue
+                    if not k.startswith(p):
+                        break
+                    l.append(k.decode())
+                    if 0 < length <= len(l):
+                        break
+
+        return l
+
+    def keys(self):
+        return self.iter(prefix='')
+
+    def connection_args(self):
+        return LMDBDriver, {'path': self.path, 'map_size': self.map_size, 'codec': self.codec}
+
+    def flush(self):
+        with self.env.begin(write=True) as txn:
+            txn.drop(self.env.open_db(), delete=False)
+
+    def delete_prefix(self, prefix: str):
+        p = prefix.encode()
+
+        with self.env.begin(write=True) as txn:
+            cursor = txn.cursor()
+            if cursor.set_range(p):
+                # Deleting moves the cursor on to the next key
+                while cursor.key().startswith(p) and cursor.delete():
+                    pass
+
+    def __delitem__(self, key: str):
+        with self.env.begin(write=True) as txn:
+            txn.delete(key.encode())
+
+
+class SQLiteDriver(Driver):
+    # Embedded storage on a single SQLite file in WAL mode. Keys are compared bytewise, so prefix scans are ordered
+    # range scans over the primary key.
+    def __init__(self, filename='lamden.db', batch_size=config.SQLITE_VARIABLE_LIMIT, codec=CODEC_JSON):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.codec = codec
+
+        self.db = sqlite3.connect(filename, isolation_level=None, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS state (k TEXT PRIMARY KEY, v BLOB NOT NULL) WITHOUT ROWID')
+
+    def get(self, item: str):
+        row = self.db.execute('SELECT v FROM state WHERE k = ?', (item,)).fetchone()
+
+        if row is None:
+            return None
+
+        return self._decode(row[0])
+
+    def get_many(self, keys):
+        values = {k: None for k in keys}
+        keys = list(values.keys())
+
+        # Stay under the maximum number of bound variables per statement
+        for i in range(0, len(keys), self.batch_size):
+            batch = keys[i:i + self.batch_size]
+            query = 'SELECT k, v FROM state WHERE k IN ({})'.format(','.join('?' * len(batch)))
+            for k, v in self.db.execute(query, batch):
+                values[k] = self._decode(v)
+
+        return values
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, writes: dict):
+        # All writes are committed in a single transaction
+        sets = []
+        deletes = []
+        for key, value in writes.items():
+            if value is None:
+                deletes.append((key, ))
+            else:
+                sets.append((key, self._encode(value, as_bytes=True)))
+
+        self.db.execute('BEGIN')
+        try:
+            self.db.executemany('INSERT OR REPLACE INTO state (k, v) VALUES (?, ?)', sets)
+            self.db.executemany('DELETE FROM state WHERE k = ?', deletes)
+        except Exception:
+            self.db.execute('ROLLBACK')
+            raise
+        self.db.execute('COMMIT')
+
+    def iter(self, prefix: str, length=0, start_after=None):
+        inclusive = start_after is None or start_after < prefix
+        lower = prefix if inclusive else start_after
+        op = '>=' if inclusive else '>'
+
+        upper = prefix_upper_bound(prefix)
+        if upper is None:
+            cur = self.db.execute('SELECT k FROM state WHERE k {} ? ORDER BY k LIMIT ?'.format(op),
+                                  (lower, length or -1))
+        else:
+            cur = self.db.execute('SELECT k FROM state WHERE k {} ? AND k < ? ORDER BY k LIMIT ?'.format(op),
+                                  (lower, upper, length or -1))
+
+        return [row[0] for row in cur]
+
+    def keys(self):
+        return self.iter(prefix='')
+
+    def connection_args(self):
+        return SQLiteDriver, {'filename': self.filename, 'batch_size': self.batch_size, 'codec': self.codec}
+
+    def flush(self):
+        self.db.execute('DELETE FROM state')
+
+    def delete_prefix(self, prefix: str):
+        upper = prefix_upper_bound(prefix)
+        if upper is None:
+            self.db.execute('DELETE FROM state WHERE k >= ?', (prefix, ))
+        else:
+            self.db.execute('DELETE FROM state WHERE k >= ? AND k < ?', (prefix, upper))
+
+    def __delitem__(self, key: str):
+        self.db.execute('DELETE FROM state WHERE k = ?', (key, ))
+
+
+# Types whose instances cannot be changed in place by contract code, so their encoded size can be cached
+SIZE_CACHEABLE_TYPES = {int, str, bool, bytes, ContractingDecimal, Datetime, Timedelta}
+
+MISSING = object()
+
+
+def snapshot(value):
+    if value is None or type(value) in SIZE_CACHEABLE_TYPES:
+        return value
+    return deepcopy(value)
+
+
+class LRUCache:
+    # Least recently used cache of committed state, bounded by the encoded size of its keys and values. Values that
+    # contract code could change in place are kept encoded and decoded into a fresh object on every hit.
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+
+        value, size, encoded = entry
+        if encoded:
+            return decode(value)
+        return value
+
+    def put(self, key, value, size=None):
+        if self.max_bytes <= 0:
+            return
+
+        encoded = value is not None and type(value) not in SIZE_CACHEABLE_TYPES
+        if encoded:
+            k, value = encode_kv(key, value)
+            size = len(k) + len(value)
+        elif size is None:
+            k, v = encode_kv(key, value)
+            size = len(k) + len(v)
+
+        self.invalidate(key)
+
+        if size > self.max_bytes:
+            return
+
+        self.entries[key] = (value, size, encoded)
+        self.bytes += size
+
+        while self.bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def invalidate(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes
+        }
+
+
 class CacheDriver:
-    def __init__(self, driver: Driver=Driver()):
+    def __init__(self, driver: Driver=Driver(), read_cache_size=config.READ_CACHE_SIZE, metrics=None):
         self.driver = driver
         self.cache = {}
 
+        # Optional metrics Registry for the cache hit ratio and the latency of the backing driver
+        self.metrics = metrics
+
+        # Committed state that survives clear_pending_state. Disabled when read_cache_size is 0 because it assumes
+        # every write to the backing driver goes through this CacheDriver.
+        self.read_cache = LRUCache(read_cache_size)
+
+        # Values fetched ahead of time by prefetch. They are only metered and marked as read once they are gotten.
+        self.prefetched = {}
+
+        # Uncommitted writes made elsewhere that reads should see, such as the pending writes of the block a parallel
+        # worker runs a transaction of. Like prefetched values, they are marked as read once they are gotten.
+        self.base = {}
+
+        # Encoded sizes of cached values as (value, size) so hits are metered without encoding the value again
+        self.sizes = {}
+
         self.reads = set()
+        self.prefix_reads = set()
+
+        # Writes are layered copy-on-write: a stack of layers opened with begin (one per transaction), on top of the
+        # pending writes of the block, on top of the committed state in the backing driver. Mutable values are copied
+        # once, when their layer is merged, so the writes handed out for a transaction can't be changed by later ones.
+        self.layers = []
         self.pending_writes = {}
 
     def get(self, key: str, mark=True):
         # Try to get from cache
         v = self.cache.get(key)
         if v is not None:
-            rt.deduct_read(*encode_kv(key, v))
+            if self.metrics is not None:
+                self.metrics.counter(CACHE_HITS).inc()
+            self._deduct_read(key, v)
             return v
 
-        # If it doesn't exist, get from db, add to cache
-        dv = self.driver.get(key)
-        rt.deduct_read(*encode_kv(key, dv))
+        # If it doesn't exist, get from the base, the prefetched values, the read cache or the db, add to cache
+        dv = self.base.get(key, MISSING)
+        if dv is MISSING:
+            dv = self.prefetched.get(key, MISSING)
+        if dv is MISSING:
+            dv = self.read_cache.get(key)
+
+        if dv is MISSING:
+            dv = self._driver_get(key)
+            self.read_cache.put(key, dv)
+        elif self.metrics is not None:
+            self.metrics.counter(CACHE_HITS).inc()
+
+        self._deduct_read(key, dv)
 
         self.cache[key] = dv
 
@@ -179,29 +592,143 @@ class CacheDriver:
 
         return dv
 
+    def _driver_get(self, key):
+        if self.metrics is None:
+            return self.driver.get(key)
+
+        self.metrics.counter(CACHE_MISSES).inc()
+        with self.metrics.timer(DRIVER_GET_SECONDS):
+            return self.driver.get(key)
+
+    def _deduct_read(self, key, value):
+        if not rt.tracer.is_started():
+            return
+
+        # Reuse the encoded size of an immutable value if it is still the object in the cache
+        entry = self.sizes.get(key)
+        if entry is not None and entry[0] is value:
+            rt.deduct_read_size(entry[1])
+            return
+
+        k, v = encode_kv(key, value)
+        rt.deduct_read(k, v)
+        self._store_size(key, value, len(k) + len(v))
+
+    def _store_size(self, key, value, size):
+        if type(value) in SIZE_CACHEABLE_TYPES:
+            self.sizes[key] = (value, size)
+        else:
+            self.sizes.pop(key, None)
+
+    def get_many(self, keys, mark=True):
+        self.prefetch(keys)
+        return {k: self.get(k, mark=mark) for k in keys}
+
+    def prefetch(self, keys):
+        missing = []
+        for k in keys:
+            if self.cache.get(k) is not None or k in self.base or k in self.prefetched:
+                continue
+
+            v = self.read_cache.get(k)
+            if v is MISSING:
+                missing.append(k)
+            else:
+                self.prefetched[k] = v
+
+        if len(missing) > 0:
+            if self.metrics is None:
+                values = self.driver.get_many(missing)
+            else:
+                with self.metrics.timer(DRIVER_GET_SECONDS):
+                    values = self.driver.get_many(missing)
+            for k, v in values.items():
+                self.read_cache.put(k, v)
+            self.prefetched.update(values)
+
     def set(self, key, value, mark=True):
-        rt.deduct_write(*encode_kv(key, value))
+        k, v = encode_kv(key, value)
+        rt.deduct_write(k, v)
+        self._store_size(key, value, len(k) + len(v))
 
         if type(value) == decimal.Decimal or type(value) == float:
             value = ContractingDecimal(str(value))
 
         self.cache[key] = value
         if mark:
-            self.pending_writes[key] = value
+            self._top_layer()[key] = value
 
     def delete(self, key, mark=True):
         self.set(key, None, mark=mark)
 
+    def _top_layer(self):
+        if len(self.layers) > 0:
+            return self.layers[-1]
+        return self.pending_writes
+
+    def begin(self):
+        self.layers.append({})
+
+    def merge(self):
+        # Folds the top layer into the one below it and returns its writes. Mutable values are copied here, once, so
+        # changes made to them in place by later transactions don't leak into the writes of this one.
+        writes = {k: snapshot(v) for k, v in self.layers.pop().items()}
+        self._top_layer().update(writes)
+        return writes
+
+    def rollback(self):
+        # Drops the top layer and restores the cache to the values written below it
+        layer = self.layers.pop()
+
+        for key in layer:
+            self.sizes.pop(key, None)
+
+            for lower in reversed([self.pending_writes] + self.layers):
+                if key in lower:
+                    self.cache[key] = snapshot(lower[key])
+                    break
+            else:
+                self.cache.pop(key, None)
+
+        return layer
+
+    def writes(self):
+        # All uncommitted writes, including the ones in open layers
+        if len(self.layers) == 0:
+            return self.pending_writes
+
+        writes = dict(self.pending_writes)
+        for layer in self.layers:
+            writes.update(layer)
+        return writes
+
     def commit(self):
-        for k, v in self.pending_writes.items():
+        writes = self.writes()
+        if self.metrics is None:
+            self.driver.set_many(writes)
+        else:
+            with self.metrics.timer(DRIVER_SET_SECONDS):
+                self.driver.set_many(writes)
+
+        # Keep the read cache in line with the committed state. Values with a known size are written through, the rest
+        # are dropped and read again when needed.
+        for k, v in writes.items():
+            entry = self.sizes.get(k)
             if v is None:
-                self.driver.delete(k)
+                self.read_cache.put(k, None)
+            elif entry is not None and entry[0] is v:
+                self.read_cache.put(k, v, entry[1])
             else:
-                self.driver.set(k, v)
+                self.read_cache.invalidate(k)
 
     def clear_pending_state(self):
         self.cache.clear()
+        self.base.clear()
+        self.prefetched.clear()
+        self.sizes.clear()
         self.reads.clear()
+        self.prefix_reads.clear()
+        self.layers.clear()
         self.pending_writes.clear()
 
 
@@ -210,7 +737,16 @@ class ContractDriver(CacheDriver):
         super().__init__(*args, **kwargs)
         self.delimiter = '.'
 
+    def _load_base(self, prefix):
+        # Scans find uncommitted keys in the cache, so the base under prefix is moved there first. Its keys don't need
+        # to be marked as read, as the prefix is recorded as scanned.
+        for k, v in self.base.items():
+            if k.startswith(prefix) and k not in self.cache:
+                self.cache[k] = v
+
     def items(self, prefix=''):
+        self._load_base(prefix)
+
         # Get all of the items in the cache currently
         _items = {}
         keys = set()
@@ -221,6 +757,7 @@ class ContractDriver(CacheDriver):
 
         # Get all of the keys we need
         db_keys = set(self.driver.iter(prefix=prefix))
+        self.prefix_reads.add(prefix)
 
         # Subtract the already gotten keys
         for k in db_keys - keys:
@@ -228,6 +765,59 @@ class ContractDriver(CacheDriver):
 
         return _items
 
+    def iter(self, prefix='', limit=0, start_after=None, mark=True):
+        # Lazily yields the (key, value) pairs under prefix in key order, starting after start_after if it is given.
+        # Committed keys are scanned a page at a time and each value is gotten (and metered) as it is consumed, so a
+        # caller can stop partway through a large hash and continue later from the last key it saw.
+        self.prefix_reads.add(prefix)
+        self._load_base(prefix)
+
+        pending = sorted(k for k, v in self.cache.items()
+                         if v is not None and k.startswith(prefix) and (start_after is None or k > start_after))
+
+        count = 0
+        last = None
+        for k in heapq.merge(pending, self._scan(prefix, start_after)):
+            # Keys that are both cached and committed come up twice, and deleted ones are cached as None
+            if k == last or (k in self.cache and self.cache[k] is None):
+                continue
+            last = k
+
+            v = self.get(k, mark=mark)
+
+            yield k, v
+
+            count += 1
+            if count == limit:
+                return
+
+    def _scan(self, prefix, start_after):
+        while True:
+            page = self.driver.iter(prefix=prefix, length=config.ITER_PAGE_SIZE, start_after=start_after)
+            yield from page
+
+            if len(page) < config.ITER_PAGE_SIZE:
+                return
+            start_after = page[-1]
+
+    def delete_prefix(self, prefix, mark=True):
+        # Deletes every key under prefix without reading its value. Each deletion is metered on the bytes of its key
+        # alone, and keys that are already deleted are skipped.
+        self.prefix_reads.add(prefix)
+        self._load_base(prefix)
+
+        keys = [k for k, v in self.cache.items() if v is not None and k.startswith(prefix)]
+        keys.extend(k for k in self._scan(prefix, None) if k not in self.cache)
+
+        layer = self._top_layer()
+        for key in keys:
+            rt.deduct_write(key.encode(), b'')
+
+            self.sizes.pop(key, None)
+            self.cache[key] = None
+            if mark:
+                layer[key] = None
+
     def keys(self, prefix=''):
         return list(self.items(prefix).keys())
 
@@ -251,8 +841,20 @@ class ContractDriver(CacheDriver):
     def get_contract(self, name):
         return self.get_var(name, CODE_KEY)
 
+    def get_manifest(self, name):
+        return self.get_var(name, MANIFEST_KEY)
+
+    def contract_exists(self, name):
+        # Contracts submitted before manifests were recorded only have their source to go by
+        return self.get_manifest(name) is not None or self.get_contract(name) is not None
+
     def get_owner(self, name):
-        owner = self.get_var(name, OWNER_KEY)
+        manifest = self.get_manifest(name)
+        if manifest is not None:
+            owner = manifest['owner']
+        else:
+            owner = self.get_var(name, OWNER_KEY)
+
         if owner == '':
             owner = None
         return owner
@@ -263,8 +865,11 @@ class ContractDriver(CacheDriver):
     def get_compiled(self, name):
         return self.get_var(name, COMPILED_KEY)
 
+    def get_dependencies(self, name):
+        return self.get_var(name, DEPENDENCIES_KEY)
+
     def set_contract(self, name, code, owner=None, overwrite=False, timestamp=Datetime._from_datetime(datetime.now()), developer=None):
-        if self.get_contract(name) is None:
+        if not self.contract_exists(name):
             code_obj = compile(code, '', 'exec')
             code_blob = marshal.dumps(code_obj)
 
@@ -273,20 +878,44 @@ class ContractDriver(CacheDriver):
             self.set_var(name, OWNER_KEY, value=owner)
             self.set_var(name, TIME_KEY, value=timestamp)
             self.set_var(name, DEVELOPER_KEY, value=developer)
+            self.set_var(name, DEPENDENCIES_KEY, value=dependencies_for_contract(code))
+
+            # Small summary of the contract, so checking that it exists or who owns it doesn't read the code. The hash
+            # is of the source, as marshalled code differs between Python versions and even between processes.
+            self.set_var(name, MANIFEST_KEY, value={
+                'hash': hashlib.sha3_256(code.encode()).hexdigest(),
+                'size': len(code),
+                'owner': owner,
+                'compiled': True
+            })
+
+            rt.module_cache.invalidate(name)
 
     def delete_contract(self, name):
-        for key in self.keys(name):
-            if self.cache.get(key) is not None:
-                del self.cache[key]
+        # Drop whatever is cached of the contract, then delete its committed keys as one range
+        prefix = name + self.delimiter
+
+        keys = [k for k in self.cache.keys() if k.startswith(prefix)]
+        keys.extend(k for k in self.base.keys() if k.startswith(prefix))
+        keys.extend(k for k in self.read_cache.entries.keys() if k.startswith(prefix))
+
+        for key in keys:
+            self.cache.pop(key, None)
+            self.base.pop(key, None)
+            self.pending_writes.pop(key, None)
+            for layer in self.layers:
+                layer.pop(key, None)
+            self.read_cache.invalidate(key)
 
-            if self.pending_writes.get(key) is not None:
-                del self.pending_writes[key]
+        self.driver.delete_prefix(prefix)
 
-            self.driver.delete(key)
+        rt.module_cache.invalidate(name)
 
     def flush(self):
         self.driver.flush()
         self.clear_pending_state()
+        self.read_cache.clear()
+        rt.module_cache.clear()
 
     def get_contract_keys(self, name):
         return self.keys(name)
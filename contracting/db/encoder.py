@@ -1,9 +1,16 @@
 import json
+import math
 import decimal
 from contracting.stdlib.bridge.time import Datetime, Timedelta
 from contracting.stdlib.bridge.decimal import ContractingDecimal, MAX_LOWER_PRECISION, fix_precision
 from contracting.config import INDEX_SEPARATOR, DELIMITER
 
+# Optional, used to parse JSON state when it is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 ##
 # ENCODER CLASS
 # Add to this to encode Python types for storage.
@@ -61,16 +68,94 @@ def encode(data: str):
     return json.dumps(data, cls=Encoder, separators=(',', ':'))
 
 
-def as_object(d):
+def _as_tagged(d):
     if '__time__' in d:
         return Datetime(*d['__time__'])
     elif '__delta__' in d:
-        return Timedelta(days=d['__delta__'][0], seconds=d['__delta__'][1])
+        return Timedelta._from_parts(d['__delta__'][0], d['__delta__'][1])
     elif '__bytes__' in d:
         return bytes.fromhex(d['__bytes__'])
     elif '__fixed__' in d:
         return ContractingDecimal(d['__fixed__'])
-    return dict(d)
+    return d
+
+
+TAGS = {
+    '__time__': lambda v: Datetime(*v),
+    '__delta__': lambda v: Timedelta._from_parts(v[0], v[1]),
+    '__bytes__': bytes.fromhex,
+    '__fixed__': ContractingDecimal
+}
+
+TAG_KEYS = frozenset(TAGS)
+
+
+def as_object(d):
+    # The Encoder writes every tagged value as an object with the tag as its only key, so those are dispatched on that
+    # key. Any other object that has a tag key among others is decoded as it always was. Plain objects are fresh dicts
+    # from the parser and are returned as they are.
+    if len(d) == 1:
+        for tag, value in d.items():
+            decoder = TAGS.get(tag)
+            if decoder is not None:
+                return decoder(value)
+            return d
+
+    if TAG_KEYS.isdisjoint(d):
+        return d
+
+    return _as_tagged(d)
+
+
+class _Float(Exception):
+    pass
+
+
+NESTED = {dict, list, float}
+
+
+def _restore(o):
+    # Applies as_object bottom up like the object_hook of json.loads does. Floats can't be restored exactly once they
+    # are parsed, so they abort this and the document is parsed again by json.
+    t = type(o)
+    if t == dict:
+        if not NESTED.isdisjoint(map(type, o.values())):
+            for k, v in o.items():
+                o[k] = _restore(v)
+        return as_object(o)
+
+    elif t == list:
+        if not NESTED.isdisjoint(map(type, o)):
+            for i, v in enumerate(o):
+                if type(v) == dict and NESTED.isdisjoint(map(type, v.values())):
+                    o[i] = as_object(v)
+                else:
+                    o[i] = _restore(v)
+        return o
+
+    elif t == float:
+        raise _Float
+
+    return o
+
+
+def _loads_orjson(data):
+    # Falls back to json for anything orjson does not parse to the same values: floats (which json parses as
+    # ContractingDecimals), integers beyond 64 bits, NaN and Infinity, and invalid documents.
+    try:
+        return _restore(orjson.loads(data))
+    except (_Float, orjson.JSONDecodeError):
+        return _loads_json(data)
+
+
+def _loads_json(data):
+    try:
+        return json.loads(data, parse_float=ContractingDecimal, object_hook=as_object)
+    except json.decoder.JSONDecodeError as e:
+        return None
+
+
+_loads = _loads_json if orjson is None else _loads_orjson
 
 
 # Decode has a hook for JSON objects, which are just Python dictionaries. You have to specify the logic in this hook.
@@ -80,13 +165,253 @@ def decode(data):
         return None
 
     if isinstance(data, bytes):
+        if data[:1] == BINARY_MAGIC:
+            return decode_binary(data)
         data = data.decode()
 
+    return _loads(data)
+
+
+##
+# BINARY CODEC
+# A compact, tagged alternative to JSON for storing state. Encoded values start with a magic byte that can never begin
+# a JSON document (0xC1 is not valid UTF-8) followed by a format version, so decode can tell both formats apart and
+# existing JSON state keeps working while it is migrated. Values decode to exactly what the JSON format decodes to.
+#
+# Metering is not affected by the codec: stamps are always charged on the JSON length of a value (see encode_kv), so
+# every node charges the same no matter how it stores state.
+##
+
+CODEC_JSON = 'json'
+CODEC_BINARY = 'binary'
+
+BINARY_MAGIC = b'\xc1'
+BINARY_VERSION = 1
+
+TAG_NONE = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT = 3
+TAG_STR = 4
+TAG_LIST = 5
+TAG_DICT = 6
+TAG_FIXED = 7
+TAG_TIME = 8
+TAG_DELTA = 9
+TAG_BYTES = 10
+TAG_FLOAT = 11
+
+
+def _pack_uint(i, out: bytearray):
+    while i > 0x7F:
+        out.append((i & 0x7F) | 0x80)
+        i >>= 7
+    out.append(i)
+
+
+def _pack_int(i, out: bytearray):
+    # Zigzag encoding so small negative numbers stay small
+    _pack_uint(i * 2 if i >= 0 else -i * 2 - 1, out)
+
+
+def _pack_str(s: str, out: bytearray):
+    b = s.encode()
+    _pack_uint(len(b), out)
+    out.extend(b)
+
+
+def _json_key(k):
+    # Dictionary keys are coerced exactly like json.dumps does
+    if isinstance(k, str):
+        return k
+    elif k is True:
+        return 'true'
+    elif k is False:
+        return 'false'
+    elif k is None:
+        return 'null'
+    elif isinstance(k, int):
+        return int.__repr__(k)
+    elif isinstance(k, float):
+        return float.__repr__(k)
+    raise TypeError('keys must be str, int, float, bool or None, not {}'.format(k.__class__.__name__))
+
+
+def _pack(o, out: bytearray):
+    t = type(o)
+
+    if o is None:
+        out.append(TAG_NONE)
+    elif o is True:
+        out.append(TAG_TRUE)
+    elif o is False:
+        out.append(TAG_FALSE)
+    elif t == int:
+        out.append(TAG_INT)
+        _pack_int(o, out)
+    elif t == str:
+        out.append(TAG_STR)
+        _pack_str(o, out)
+    elif t == list or t == tuple:
+        out.append(TAG_LIST)
+        _pack_uint(len(o), out)
+        for item in o:
+            _pack(item, out)
+    elif t == dict:
+        out.append(TAG_DICT)
+        _pack_uint(len(o), out)
+        for k, v in o.items():
+            _pack_str(_json_key(k), out)
+            _pack(v, out)
+    elif t == ContractingDecimal or t.__name__ == ContractingDecimal.__name__:
+        out.append(TAG_FIXED)
+        _pack_str(str(fix_precision(o._d)), out)
+    elif isinstance(o, decimal.Decimal):
+        out.append(TAG_FIXED)
+        _pack_str(str(fix_precision(o)), out)
+    elif t == float:
+        if math.isfinite(o):
+            # JSON writes the repr of a float and parses it back as a ContractingDecimal
+            out.append(TAG_FIXED)
+            _pack_str(float.__repr__(o), out)
+        else:
+            out.append(TAG_FLOAT)
+            _pack_str(float.__repr__(o), out)
+    elif t == Datetime or t.__name__ == Datetime.__name__:
+        out.append(TAG_TIME)
+        for field in (o.year, o.month, o.day, o.hour, o.minute, o.second, o.microsecond):
+            _pack_uint(field, out)
+    elif t == Timedelta or t.__name__ == Timedelta.__name__:
+        out.append(TAG_DELTA)
+        _pack_int(o._timedelta.days, out)
+        _pack_uint(o._timedelta.seconds, out)
+    elif isinstance(o, bytes):
+        out.append(TAG_BYTES)
+        _pack_uint(len(o), out)
+        out.extend(o)
+    elif isinstance(o, int):
+        out.append(TAG_INT)
+        _pack_int(int(o), out)
+    elif isinstance(o, str):
+        out.append(TAG_STR)
+        _pack_str(str(o), out)
+    elif isinstance(o, (list, tuple)):
+        _pack(list(o), out)
+    elif isinstance(o, dict):
+        _pack(dict(o), out)
+    else:
+        raise TypeError('Object of type {} is not serializable'.format(t.__name__))
+
+
+def _unpack_uint(data, i):
+    result = 0
+    shift = 0
+    while True:
+        b = data[i]
+        i += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, i
+        shift += 7
+
+
+def _unpack_int(data, i):
+    z, i = _unpack_uint(data, i)
+    return (z >> 1) ^ -(z & 1), i
+
+
+def _unpack_str(data, i):
+    n, i = _unpack_uint(data, i)
+    end = i + n
+    if end > len(data):
+        raise ValueError('Truncated string.')
+    return data[i:end].decode(), end
+
+
+def _unpack(data, i):
+    tag = data[i]
+    i += 1
+
+    if tag == TAG_INT:
+        return _unpack_int(data, i)
+    elif tag == TAG_STR:
+        return _unpack_str(data, i)
+    elif tag == TAG_FIXED:
+        s, i = _unpack_str(data, i)
+        return ContractingDecimal(s), i
+    elif tag == TAG_DICT:
+        n, i = _unpack_uint(data, i)
+        d = {}
+        for _ in range(n):
+            k, i = _unpack_str(data, i)
+            d[k], i = _unpack(data, i)
+        # Dicts that happen to look like tagged values are coerced by the JSON format, so they are here as well
+        return as_object(d), i
+    elif tag == TAG_LIST:
+        n, i = _unpack_uint(data, i)
+        l = []
+        for _ in range(n):
+            v, i = _unpack(data, i)
+            l.append(v)
+        return l, i
+    elif tag == TAG_NONE:
+        return None, i
+    elif tag == TAG_TRUE:
+        return True, i
+    elif tag == TAG_FALSE:
+        return False, i
+    elif tag == TAG_TIME:
+        fields = []
+        for _ in range(7):
+            f, i = _unpack_uint(data, i)
+            fields.append(f)
+        return Datetime(*fields), i
+    elif tag == TAG_DELTA:
+        days, i = _unpack_int(data, i)
+        seconds, i = _unpack_uint(data, i)
+        return Timedelta._from_parts(days, seconds), i
+    elif tag == TAG_BYTES:
+        n, i = _unpack_uint(data, i)
+        if i + n > len(data):
+            raise ValueError('Truncated bytes.')
+        return bytes(data[i:i + n]), i + n
+    elif tag == TAG_FLOAT:
+        s, i = _unpack_str(data, i)
+        return float(s), i
+
+    raise ValueError('Unknown tag {}.'.format(tag))
+
+
+def encode_binary(data) -> bytes:
+    out = bytearray(BINARY_MAGIC)
+    out.append(BINARY_VERSION)
+    _pack(data, out)
+    return bytes(out)
+
+
+def decode_binary(data: bytes):
+    if data[:1] != BINARY_MAGIC or data[1:2] != bytes([BINARY_VERSION]):
+        return None
+
     try:
-        return json.loads(data, parse_float=ContractingDecimal, object_hook=as_object)
-    except json.decoder.JSONDecodeError as e:
+        value, i = _unpack(data, 2)
+    except (IndexError, ValueError, UnicodeDecodeError):
+        return None
+
+    if i != len(data):
         return None
 
+    return value
+
+
+def encode_for_storage(data, codec=CODEC_JSON, as_bytes=False):
+    if codec == CODEC_BINARY:
+        return encode_binary(data)
+
+    if as_bytes:
+        return encode(data).encode()
+    return encode(data)
+
 
 def make_key(contract, variable, args=[]):
     contract_variable = INDEX_SEPARATOR.join((contract, variable))
@@ -93,14 +93,25 @@ class Hash(Datum):
         prefix = self._prefix_for_args(args)
         return self._driver.values(prefix=prefix)
 
+    def iter(self, *args, limit=0, start_after=None):
+        # Lazily yields (key, value) pairs of the hash, or of the part of it under args, in key order. Keys that have
+        # more dimensions than args are yielded as tuples. Pass the last key seen as start_after to continue from it.
+        prefix = self._prefix_for_args(args)
+        if start_after is not None:
+            start_after = prefix + self._validate_key(start_after)
+
+        for k, v in self._driver.iter(prefix=prefix, limit=limit, start_after=start_after):
+            key = k[len(prefix):]
+            if self._delimiter in key:
+                key = tuple(key.split(self._delimiter))
+            yield key, v
+
     def _items(self, *args):
         prefix = self._prefix_for_args(args)
         return self._driver.items(prefix=prefix)
 
     def clear(self, *args):
-        kvs = self._items(*args)
-        for k in kvs.keys():
-            self._driver.delete(k)
+        self._driver.delete_prefix(self._prefix_for_args(args))
 
     def __setitem__(self, key, value):
         # handle multiple hashes differently
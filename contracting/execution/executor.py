@@ -1,12 +1,18 @@
 import importlib
 from contracting.execution import runtime
-from contracting.db.driver import ContractDriver
-from contracting.execution.module import install_database_loader, uninstall_builtins, enable_restricted_imports, disable_restricted_imports
+from contracting.db.driver import ContractDriver, MANIFEST_KEY, DEPENDENCIES_KEY
+from contracting.execution.profiler import Profiler
+from contracting.execution.metrics import TX_SECONDS, TX_TOTAL, TX_FAILED, TRACED_SECONDS, TRACED_LINES
+from contracting.execution.module import install_database_loader, uninstall_builtins, enable_restricted_imports, disable_restricted_imports, \
+    preload_modules
 from contracting.stdlib.bridge.decimal import ContractingDecimal, CONTEXT
 from contracting.stdlib.bridge.random import Seeded
 from contracting import config
-from copy import deepcopy
+import multiprocessing
+import pickle
+import copy
 import decimal
+import time
 from logging import getLogger
 
 log = getLogger('CONTRACTING')
@@ -14,14 +20,28 @@ import traceback
 
 class Executor:
     def __init__(self, production=False, driver=None, metering=True,
-                 currency_contract='currency', balances_hash='balances', bypass_privates=False):
+                 currency_contract='currency', balances_hash='balances', bypass_privates=False, metrics=None):
 
         self.metering = metering
 
         self.driver = driver
 
+        # An optional metrics Registry. It is also handed to the driver, and through it to the module loader, so that
+        # the whole stack reports into it.
+        self.metrics = metrics
+
         if not self.driver:
             self.driver = ContractDriver()
+
+            if self.metrics is not None:
+                # The backing driver counts the bytes encoded and decoded. The default one is shared by every
+                # ContractDriver, so a copy of it, which shares its connection, is instrumented instead.
+                backing = copy.copy(self.driver.driver)
+                backing.metrics = metrics
+                self.driver = ContractDriver(driver=backing, metrics=metrics)
+        elif self.metrics is not None:
+            self.driver.metrics = metrics
+
         self.production = production
 
         self.currency_contract = currency_contract
@@ -29,8 +49,20 @@ class Executor:
 
         self.bypass_privates = bypass_privates
 
+        # Worker processes of parallel block execution. They are started with the first parallel block and kept for
+        # the next ones until close is called.
+        self._pool = None
+        self._pool_args = None
+
         runtime.rt.env.update({'__Driver': self.driver})
 
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+            self._pool_args = None
+
     def wipe_modules(self):
         uninstall_builtins()
         install_database_loader()
@@ -41,14 +73,12 @@ class Executor:
                 driver=None,
                 stamps=1000000,
                 stamp_cost=config.STAMPS_PER_TAU,
-                metering=None) -> dict:
+                metering=None,
+                profile=False) -> dict:
 
         if not self.bypass_privates:
             assert not function_name.startswith(config.PRIVATE_METHOD_PREFIX), 'Private method not callable.'
 
-        if metering is None:
-            metering = self.metering
-
         runtime.rt.env.update({'__Driver': self.driver})
 
         if driver:
@@ -58,15 +88,220 @@ class Executor:
 
         install_database_loader(driver=driver)
 
+        # Only saves round trips: imports are charged the same whether their module was preloaded or not
+        preload_modules(self._dependency_closure([contract_name], driver), driver)
+
+        # Opt in profiling of the contract functions the transaction runs. See profiler.folded_stacks for exporting it
+        # to flame graphs.
+        profiler = None
+        if profile:
+            profiler = Profiler()
+            profiler.start()
+
+        output = self._execute(sender=sender,
+                               contract_name=contract_name,
+                               function_name=function_name,
+                               kwargs=kwargs,
+                               environment=environment,
+                               auto_commit=auto_commit,
+                               driver=driver,
+                               stamps=stamps,
+                               stamp_cost=stamp_cost,
+                               metering=metering)
+
+        if profiler is not None:
+            profiler.stop()
+            output['profile'] = profiler.results()
+
+        output['reads'] = driver.reads
+
+        disable_restricted_imports()
+
+        return output
+
+    def execute_block(self, transactions, environment={}, driver=None, auto_commit=True, metering=None,
+                      processes=1) -> list:
+        # Transactions are dicts of the keyword arguments to execute: sender, contract_name, function_name, kwargs and
+        # optionally stamps, stamp_cost and environment (which is layered over the block environment).
+        # Every transaction runs against the same cache and the whole block is committed to the backing driver once
+        # at the end.
+        # A transaction may also list the state keys it is known to touch under 'prefetch' (for example the recipient
+        # balance of a transfer). These are fetched for the whole block in one round trip before execution starts.
+        # The code of every contract the block can import is loaded up front as well, using the dependencies
+        # recorded when the contracts were submitted.
+        if driver is None:
+            driver = self.driver
+
+        install_database_loader(driver=driver)
+
+        contracts = self._dependency_closure({tx['contract_name'] for tx in transactions}, driver)
+
+        driver.prefetch(self._prefetch_keys(transactions, contracts, driver, metering))
+        preload_modules(contracts, driver)
+
+        if processes > 1:
+            results = self._execute_block_parallel(transactions, environment, driver, metering, processes)
+        else:
+            results = [self._execute_in_block(tx, environment, driver, metering) for tx in transactions]
+
+        disable_restricted_imports()
+
+        if auto_commit:
+            driver.commit()
+            driver.clear_pending_state()
+
+        return results
+
+    def _dependency_closure(self, names, driver):
+        # Walks the dependency graph one batched read per level
+        closure = set()
+        frontier = set(names)
+
+        while len(frontier) > 0:
+            closure.update(frontier)
+
+            keys = [driver.make_key(name, DEPENDENCIES_KEY) for name in frontier]
+
+            frontier = set()
+            for dependencies in driver.get_many(keys, mark=False).values():
+                if dependencies is not None:
+                    frontier.update(dependencies)
+
+            frontier -= closure
+
+        return closure
+
+    def _prefetch_keys(self, transactions, contracts, driver, metering):
+        if metering is None:
+            metering = self.metering
+
+        keys = {driver.make_key(name, MANIFEST_KEY) for name in contracts}
+        for tx in transactions:
+            keys.update(tx.get('prefetch', []))
+
+            if metering:
+                keys.add(self._balances_key(tx['sender']))
+
+        return keys
+
+    def _balances_key(self, sender):
+        return '{}{}{}{}{}'.format(self.currency_contract,
+                                   config.INDEX_SEPARATOR,
+                                   self.balances_hash,
+                                   config.DELIMITER,
+                                   sender)
+
+    def _execute_in_block(self, tx, environment, driver, metering):
+        tx_environment = dict(environment)
+        tx_environment.update(tx.get('environment', {}))
+
+        block_reads = driver.reads
+        driver.reads = set()
+
+        runtime.rt.env.update({'__Driver': driver})
+
+        output = self._execute(sender=tx['sender'],
+                               contract_name=tx['contract_name'],
+                               function_name=tx['function_name'],
+                               kwargs=tx.get('kwargs', {}),
+                               environment=tx_environment,
+                               driver=driver,
+                               stamps=tx.get('stamps', 1000000),
+                               stamp_cost=tx.get('stamp_cost', config.STAMPS_PER_TAU),
+                               metering=metering)
+
+        output['reads'] = driver.reads
+
+        block_reads.update(driver.reads)
+        driver.reads = block_reads
+
+        return output
+
+    def _execute_block_parallel(self, transactions, environment, driver, metering, processes):
+        # Optimistic execution: every transaction is first run in a worker process against the state at the start of
+        # the block. Results are then validated in block order. A transaction that read a key (or scanned a prefix
+        # containing a key) written by an earlier transaction in the block is re-executed here against the current
+        # state, so the outcome is identical to executing the block serially. So is a transaction whose output could
+        # not be sent back from its worker.
+        pool = self._worker_pool(driver.driver, processes)
+
+        pending = driver.writes()
+        speculative = pool.starmap(_execute_speculatively,
+                                   [(tx, environment, metering, pending) for tx in transactions])
+
+        dirty = set()
+        results = []
+
+        for tx, speculated in zip(transactions, speculative):
+            if speculated is None:
+                conflict = True
+            else:
+                output, prefix_reads = pickle.loads(speculated)
+                conflict = not dirty.isdisjoint(output['reads']) or \
+                    any(k.startswith(p) for p in prefix_reads for k in dirty)
+
+            if conflict:
+                output = self._execute_in_block(tx, environment, driver, metering)
+            else:
+                driver.cache.update(output['tx_writes'])
+                driver.pending_writes.update(output['tx_writes'])
+                driver.reads.update(output['reads'])
+
+                # The worker only saw its own writes as pending
+                output['writes'] = dict(driver.writes())
+
+            dirty.update(output['tx_writes'])
+            results.append(output)
+
+        return results
+
+    def _worker_pool(self, backing, processes):
+        # Workers can't share the connection of the backing driver, so each one opens its own to the same storage
+        connection = backing.connection_args()
+        assert connection is not None, \
+            'Parallel execution needs storage that worker processes can open. {} only lives in this process.'.format(
+                type(backing).__name__)
+
+        if self._pool is None or self._pool_args != (processes, connection):
+            self.close()
+
+            options = {
+                'metering': self.metering,
+                'currency_contract': self.currency_contract,
+                'balances_hash': self.balances_hash,
+                'bypass_privates': self.bypass_privates
+            }
+
+            self._pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(options, connection))
+            self._pool_args = (processes, connection)
+
+        return self._pool
+
+    def _execute(self, sender, contract_name, function_name, kwargs, environment, driver,
+                 auto_commit=False,
+                 stamps=1000000,
+                 stamp_cost=config.STAMPS_PER_TAU,
+                 metering=None) -> dict:
+
+        if metering is None:
+            metering = self.metering
+
+        start = time.perf_counter()
+
+        # The writes of the transaction go into their own layer so they can be rolled back if it fails
+        driver.begin()
+
         balances_key = None
+        if metering:
+            balances_key = self._balances_key(sender)
+
+        traced = None
         try:
-            if metering:
-                balances_key = '{}{}{}{}{}'.format(self.currency_contract,
-                                                   config.INDEX_SEPARATOR,
-                                                   self.balances_hash,
-                                                   config.DELIMITER,
-                                                   sender)
+            # Checked again in here so that, in a block, a transaction calling a private method only fails itself
+            if not self.bypass_privates:
+                assert not function_name.startswith(config.PRIVATE_METHOD_PREFIX), 'Private method not callable.'
 
+            if metering:
                 balance = driver.get(balances_key)
                 if balance is None:
                     balance = 0
@@ -78,6 +313,7 @@ class Executor:
             runtime.rt.env.update(environment)
             status_code = 0
             runtime.rt.set_up(stmps=stamps * 1000, meter=metering) # Multiply stamps by 1000 because we divide by it later
+            traced = time.perf_counter()
 
             runtime.rt.context._base_state = {
                 'signer': sender,
@@ -102,6 +338,9 @@ class Executor:
             result = func(**kwargs)
             disable_restricted_imports()
 
+            # Fails the transaction if the memory used since the tracer last checked is over the limit
+            runtime.rt.tracer.stop()
+
             if auto_commit:
                 driver.commit()
 
@@ -113,9 +352,18 @@ class Executor:
             status_code = 1
             if auto_commit:
                 driver.clear_pending_state()
+            else:
+                driver.rollback()
+
+            # Stamps are still deducted for failed transactions
+            driver.begin()
 
         runtime.rt.tracer.stop()
 
+        if self.metrics is not None and metering and traced is not None:
+            self.metrics.histogram(TRACED_SECONDS).observe(time.perf_counter() - traced)
+            self.metrics.counter(TRACED_LINES).inc(runtime.rt.tracer.get_line_count())
+
         # Deduct the stamps if that is enabled
         stamps_used = runtime.rt.tracer.get_stamp_used()
 
@@ -150,15 +398,50 @@ class Executor:
         runtime.rt.clean_up()
         runtime.rt.env.update({'__Driver': driver})
 
-        output = {
+        if self.metrics is not None:
+            self.metrics.histogram(TX_SECONDS).observe(time.perf_counter() - start)
+            self.metrics.counter(TX_TOTAL).inc()
+            if status_code != 0:
+                self.metrics.counter(TX_FAILED).inc()
+
+        tx_writes = driver.merge()
+
+        # writes holds every write still pending on the driver, this transaction's included, and tx_writes only the
+        # ones this transaction made. Values in the layers were copied when merged, so a shallow copy is a snapshot.
+        return {
             'status_code': status_code,
             'result': result,
             'stamps_used': stamps_used,
-            'writes': deepcopy(driver.pending_writes),
-            'reads': driver.reads
+            'writes': dict(driver.writes()),
+            'tx_writes': tx_writes
         }
 
-        disable_restricted_imports()
 
-        return output
+_worker = None
+
+
+def _init_worker(options, connection):
+    # Runs once in every worker process of Executor._execute_block_parallel
+    global _worker
+
+    cls, kwargs = connection
+    _worker = Executor(driver=ContractDriver(driver=cls(**kwargs), read_cache_size=0), **options)
+
+
+def _execute_speculatively(tx, environment, metering, pending):
+    # The transaction gets a fresh cache on top of the state at the start of the block, so that its reads and prefix
+    # scans are recorded exactly. Reads of the writes still pending from before the block are recorded too, as they
+    # are only put in the base of the cache. The output is pickled here, so an output that can't be pickled only sends
+    # this transaction back to be executed serially instead of failing the whole block.
+    driver = _worker.driver
+    driver.clear_pending_state()
+    driver.base.update(pending)
+
+    install_database_loader(driver=driver)
+    output = _worker._execute_in_block(tx, environment, driver, metering)
+    disable_restricted_imports()
 
+    try:
+        return pickle.dumps((output, driver.prefix_reads))
+    except Exception:
+        return None
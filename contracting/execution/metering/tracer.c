@@ -42,6 +42,17 @@ unsigned long long cu_costs[] = {2, 4, 5, 2, 4, 1000, 1000, 1000, 2, 2, 3, 2, 10
 
 unsigned long long MAX_STAMPS = 6500000;
 
+/* getrusage is a system call, so memory is only sampled every this many metered lines. ru_maxrss never decreases, so
+   the total growth seen at each sample is the same as when sampling every line. Memory is also sampled when a contract
+   function returns and when the tracer is stopped, so the lines after the last sample are always checked. */
+#define MEMORY_SAMPLE_INTERVAL 64
+
+/* Growth of ru_maxrss, in kilobytes, that a transaction may cause */
+#define MEMORY_LIMIT 2000
+
+/* Interned once when the module is initialized */
+static PyObject *contract_key = NULL;
+
 
 /* The Tracer type. */
 
@@ -56,6 +67,17 @@ typedef struct {
     int started;
     char *cu_cost_fname;
 
+    /* Whether the globals dict of the last traced frame marks contract code. The dict is identified by its address
+       and version tag, which changes on every modification of the dict and is never reused by another dict. */
+    PyObject *last_globals;
+    uint64_t last_globals_version;
+    int last_is_contract;
+
+    unsigned long lines_since_sample;
+
+    /* Number of metered lines, each of which is charged the cost of the opcode it starts with */
+    unsigned long long lines;
+
 } Tracer;
 
 static int
@@ -69,6 +91,11 @@ Tracer_init(Tracer *self, PyObject *args, PyObject *kwds)
     self->cost = 0;
     self->last_frame_mem_usage = 0;
     self->total_mem_usage = 0;
+    self->last_globals = NULL;
+    self->last_globals_version = 0;
+    self->last_is_contract = 0;
+    self->lines_since_sample = 0;
+    self->lines = 0;
 
     return RET_OK;
 }
@@ -97,19 +124,75 @@ Tracer_dealloc(Tracer *self)
     return r_usage.ru_maxrss;
  }
 
+ static int
+ is_contract_frame(Tracer *self, PyFrameObject *frame)
+ {
+    PyDictObject *globals = (PyDictObject *) frame->f_globals;
+
+    if ((PyObject *) globals == self->last_globals && globals->ma_version_tag == self->last_globals_version) {
+        return self->last_is_contract;
+    }
+
+    // IF, Frame object globals contains __contract__ and it is true, continue
+    int t = PyDict_Contains(frame->f_globals, contract_key);
+
+    self->last_globals = frame->f_globals;
+    self->last_globals_version = globals->ma_version_tag;
+    self->last_is_contract = (t == 1);
+
+    return self->last_is_contract;
+ }
+
+ static void
+ sample_memory_usage(Tracer *self)
+ {
+    long new_memory_usage = get_memory_usage();
+
+    if (new_memory_usage > self->last_frame_mem_usage) {
+       self->total_mem_usage += (new_memory_usage - self->last_frame_mem_usage);
+    }
+
+    self->last_frame_mem_usage = new_memory_usage;
+    self->lines_since_sample = 0;
+ }
+
+ static int
+ memory_exceeded(Tracer *self)
+ {
+    if (self->total_mem_usage > MEMORY_LIMIT) {
+        PyErr_SetString(PyExc_AssertionError, "Transaction exceeded memory usage!\n");
+        PyEval_SetTrace(NULL, NULL);
+        self->started = 0;
+        return 1;
+    }
+
+    return 0;
+ }
+
  static int
  Tracer_trace(Tracer *self, PyFrameObject *frame, int what, PyObject *arg)
  {
-    unsigned long long estimate = 0;
-    unsigned long long factor = 1000;
     const char *str;
-     // IF, Frame object globals contains __contract__ and it is true, continue
 
-     PyObject *kv = PyUnicode_FromString("__contract__");
-     int t = PyDict_Contains(frame->f_globals, kv);
-     Py_DECREF(kv);
+     // Returns only check the memory used by the lines since the last sample
+     if (what == PyTrace_RETURN) {
+        if (self->lines_since_sample > 0 && is_contract_frame(self, frame)) {
+            sample_memory_usage(self);
 
-     if (t != 1) {
+            if (memory_exceeded(self)) {
+                return RET_ERROR;
+            }
+        }
+
+        return RET_OK;
+     }
+
+     // Only lines are metered, so skip calls and exceptions before doing any other work
+     if (what != PyTrace_LINE) {
+        return RET_OK;
+     }
+
+     if (!is_contract_frame(self, frame)) {
         return RET_OK;
      }
 
@@ -119,48 +202,31 @@ Tracer_dealloc(Tracer *self)
 
      int opcode;
 
-     switch (what) {
-         case PyTrace_LINE:      /* 2 */
-             // printf("LINE\n");
-             str = PyBytes_AS_STRING(frame->f_code->co_code);
-             opcode = str[frame->f_lasti];
-
-             if (opcode < 0) opcode = -opcode;
+     str = PyBytes_AS_STRING(frame->f_code->co_code);
+     opcode = str[frame->f_lasti];
 
-             estimate = (self->cost + cu_costs[opcode]) / factor;
-             estimate = estimate + 1;
+     if (opcode < 0) opcode = -opcode;
 
-             long new_memory_usage = get_memory_usage();
+     self->lines_since_sample++;
 
-             if (new_memory_usage > self->last_frame_mem_usage) {
-                self->total_mem_usage += (new_memory_usage - self->last_frame_mem_usage);
-             }
-
-             self->last_frame_mem_usage = new_memory_usage;
-
-             //estimate = estimate * factor;
-             if ((self->cost > self->stamp_supplied) || self->cost > MAX_STAMPS) {
-                 PyErr_SetString(PyExc_AssertionError, "The cost has exceeded the stamp supplied!\n");
-                 PyEval_SetTrace(NULL, NULL);
-                 self->started = 0;
-                 return RET_ERROR;
-             }
-
-             if (self->total_mem_usage > 2000) {
-                 PyErr_SetString(PyExc_AssertionError, "Transaction exceeded memory usage!\n");
-                 PyEval_SetTrace(NULL, NULL);
-                 self->started = 0;
-                 return RET_ERROR;
-             }
-
-             self->cost += cu_costs[opcode];
-             break;
+     if (self->lines_since_sample >= MEMORY_SAMPLE_INTERVAL) {
+        sample_memory_usage(self);
+     }
 
-         default:
-             break;
+     //estimate = estimate * factor;
+     if ((self->cost > self->stamp_supplied) || self->cost > MAX_STAMPS) {
+         PyErr_SetString(PyExc_AssertionError, "The cost has exceeded the stamp supplied!\n");
+         PyEval_SetTrace(NULL, NULL);
+         self->started = 0;
+         return RET_ERROR;
      }
 
+     if (memory_exceeded(self)) {
+         return RET_ERROR;
+     }
 
+     self->cost += cu_costs[opcode];
+     self->lines++;
 
      return RET_OK;
  }
@@ -170,6 +236,9 @@ Tracer_start(Tracer *self, PyObject *args)
 {
     PyEval_SetTrace((Py_tracefunc)Tracer_trace, (PyObject*)self);
     self->cost = 0;
+    self->last_globals = NULL;
+    self->lines_since_sample = 0;
+    self->lines = 0;
 
     self->started = 1;
     return Py_BuildValue("");
@@ -181,6 +250,15 @@ Tracer_stop(Tracer *self, PyObject *args)
     if (self->started) {
         PyEval_SetTrace(NULL, NULL);
         self->started = 0;
+
+        // Raises if the lines since the last sample went over the limit
+        if (self->lines_since_sample > 0) {
+            sample_memory_usage(self);
+
+            if (memory_exceeded(self)) {
+                return NULL;
+            }
+        }
     }
 
     return Py_BuildValue("");
@@ -201,6 +279,9 @@ Tracer_reset(Tracer *self)
     self->started = 0;
     self->last_frame_mem_usage = 0;
     self->total_mem_usage = 0;
+    self->last_globals = NULL;
+    self->lines_since_sample = 0;
+    self->lines = 0;
 
     return Py_BuildValue("");
 }
@@ -231,6 +312,12 @@ Tracer_get_stamp_used(Tracer *self, PyObject *args, PyObject *kwds)
 }
 
 
+static PyObject *
+Tracer_get_line_count(Tracer *self, PyObject *args, PyObject *kwds)
+{
+    return Py_BuildValue("K", self->lines);
+}
+
 static PyObject *
 Tracer_get_last_frame_mem_usage(Tracer *self, PyObject *args, PyObject *kwds)
 {
@@ -275,6 +362,9 @@ Tracer_methods[] = {
     { "get_stamp_used",  (PyCFunction) Tracer_get_stamp_used,     METH_VARARGS,
             PyDoc_STR("Get the stamp usage after it's been completed") },
 
+    { "get_line_count",  (PyCFunction) Tracer_get_line_count,     METH_VARARGS,
+            PyDoc_STR("Get the number of lines metered since the tracer was started.") },
+
     { "get_last_frame_mem_usage",  (PyCFunction) Tracer_get_last_frame_mem_usage,     METH_VARARGS,
             PyDoc_STR("Get the memory usage of the last Python frame processed.") },
 
@@ -369,6 +459,12 @@ PyInit_tracer(void)
         return NULL;
     }
 
+    contract_key = PyUnicode_InternFromString("__contract__");
+    if (contract_key == NULL) {
+        Py_DECREF(mod);
+        return NULL;
+    }
+
     PyModule_AddObject(mod, "Tracer", (PyObject *)&TracerType);
     return mod;
 }
@@ -393,6 +489,8 @@ inittracer(void)
         return;
     }
 
+    contract_key = PyString_InternFromString("__contract__");
+
 
     PyModule_AddObject(mod, "Tracer", (PyObject *)&TracerType);
 }
@@ -0,0 +1,197 @@
+import bisect
+import time
+from collections import OrderedDict
+
+# Upper bounds of the histogram buckets, in seconds
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1, 2.5, 5)
+
+TX_SECONDS = 'contracting_tx_seconds'
+TX_TOTAL = 'contracting_tx_total'
+TX_FAILED = 'contracting_tx_failed_total'
+TRACED_SECONDS = 'contracting_traced_seconds'
+TRACED_LINES = 'contracting_traced_lines_total'
+DRIVER_GET_SECONDS = 'contracting_driver_get_seconds'
+DRIVER_SET_SECONDS = 'contracting_driver_set_seconds'
+CACHE_HITS = 'contracting_cache_hits_total'
+CACHE_MISSES = 'contracting_cache_misses_total'
+CACHE_HIT_RATIO = 'contracting_cache_hit_ratio'
+MODULE_LOADS = 'contracting_module_loads_total'
+MODULE_CACHE_HITS = 'contracting_module_cache_hits_total'
+BYTES_ENCODED = 'contracting_bytes_encoded_total'
+BYTES_DECODED = 'contracting_bytes_decoded_total'
+
+HELP = {
+    TX_SECONDS: 'Wall time of executing a transaction.',
+    TX_TOTAL: 'Transactions executed.',
+    TX_FAILED: 'Transactions that raised an exception.',
+    TRACED_SECONDS: 'Wall time of metered transactions spent with the tracer running.',
+    TRACED_LINES: 'Lines of contract code run under the tracer.',
+    DRIVER_GET_SECONDS: 'Latency of reads from the backing driver, single or batched.',
+    DRIVER_SET_SECONDS: 'Latency of committing writes to the backing driver.',
+    CACHE_HITS: 'Reads served from the cache, prefetched values or read cache without a round trip of their own.',
+    CACHE_MISSES: 'Reads that made a round trip to the backing driver.',
+    CACHE_HIT_RATIO: 'Share of reads that were cache hits.',
+    MODULE_LOADS: 'Compiled contract code read from the database and loaded into the module cache.',
+    MODULE_CACHE_HITS: 'Contract imports served from the module cache.',
+    BYTES_ENCODED: 'Bytes of state encoded for storage.',
+    BYTES_DECODED: 'Bytes of stored state decoded.'
+}
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help=''):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+    def samples(self):
+        yield self.name, '', self.value
+
+
+class Gauge:
+    # Its value is computed when it is read, from the function it was registered with
+    kind = 'gauge'
+
+    def __init__(self, name, help='', fn=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def snapshot(self):
+        return self.fn()
+
+    def samples(self):
+        yield self.name, '', self.fn()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help='', buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+
+        # The last count is for values above the largest bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': OrderedDict(self.cumulative())
+        }
+
+    def samples(self):
+        for bound, total in self.cumulative():
+            yield self.name + '_bucket', '{{le="{}"}}'.format(format_value(bound)), total
+        yield self.name + '_sum', '', self.sum
+        yield self.name + '_count', '', self.count
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if type(value) == float else str(value)
+
+
+class Registry:
+    # Metrics are kept in the order they were created. The built in ones are created up front so they are exported
+    # before they are first used. Pass a registry as metrics= to the Executor (or set it as the metrics attribute of a
+    # CacheDriver or backing driver) to have them instrumented. An Executor given its own driver leaves the backing
+    # driver alone, so set it there too to count bytes.
+    def __init__(self):
+        self.metrics = OrderedDict()
+        self._register_builtins()
+
+    def _register_builtins(self):
+        for name in (TX_SECONDS, TRACED_SECONDS, DRIVER_GET_SECONDS, DRIVER_SET_SECONDS):
+            self.histogram(name)
+
+        for name in (TX_TOTAL, TX_FAILED, TRACED_LINES, CACHE_HITS, CACHE_MISSES, MODULE_LOADS, MODULE_CACHE_HITS,
+                     BYTES_ENCODED, BYTES_DECODED):
+            self.counter(name)
+
+        hits = self.counter(CACHE_HITS)
+        misses = self.counter(CACHE_MISSES)
+
+        def ratio():
+            total = hits.value + misses.value
+            return hits.value / total if total > 0 else 0
+
+        self.gauge(CACHE_HIT_RATIO, ratio)
+
+    def _get(self, cls, name, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = cls(name, HELP.get(name, ''), **kwargs)
+            self.metrics[name] = metric
+        return metric
+
+    def counter(self, name):
+        return self._get(Counter, name)
+
+    def histogram(self, name, buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, buckets=buckets)
+
+    def gauge(self, name, fn):
+        return self._get(Gauge, name, fn=fn)
+
+    def timer(self, name):
+        return Timer(self.histogram(name))
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def prometheus(self):
+        # The Prometheus text exposition format, to be served as text/plain; version=0.0.4
+        lines = []
+        for metric in self.metrics.values():
+            if metric.help:
+                lines.append('# HELP {} {}'.format(metric.name, metric.help))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+
+            for name, labels, value in metric.samples():
+                lines.append('{}{} {}'.format(name, labels, format_value(value)))
+
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        self.metrics.clear()
+        self._register_builtins()
+
+
+class Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(time.perf_counter() - self.start)
+
@@ -4,10 +4,16 @@ import importlib.util
 from importlib.abc import Loader, MetaPathFinder, PathEntryFinder
 from importlib import invalidate_caches, __import__
 from importlib.machinery import ModuleSpec
-from contracting.db.driver import ContractDriver
+from contracting.db.driver import ContractDriver, CODE_KEY, COMPILED_KEY, MANIFEST_KEY
+from contracting.db.encoder import encode_kv, make_key
+from contracting.db.orm import Datum
 from contracting.stdlib import env
+from contracting.stdlib.bridge.decimal import ContractingDecimal
+from contracting.stdlib.bridge.time import Datetime, Timedelta
 from contracting.execution.runtime import rt
-from types import ModuleType
+from contracting.execution.metrics import MODULE_LOADS, MODULE_CACHE_HITS
+from types import ModuleType, FunctionType, CodeType
+import hashlib
 import marshal
 import builtins
 
@@ -78,13 +84,112 @@ class DatabaseFinder:
     driver = ContractDriver()
 
     def find_spec(self, fullname, path=None, target=None):
-        if MODULE_CACHE.get(self) is None:
-            if DatabaseFinder.driver.get_contract(self) is None:
-                return None
+        # Checked even when the module is cached, as the check is a metered read
+        if not DatabaseFinder.driver.contract_exists(self):
+            return None
         return ModuleSpec(self, DatabaseLoader(DatabaseFinder.driver))
 
 
-MODULE_CACHE = {}
+MODULE_CACHE = rt.module_cache
+
+REUSABLE_TYPES = {int, str, bool, float, bytes, type(None), ContractingDecimal, Datetime, Timedelta}
+
+
+def is_reusable(value):
+    # Whether a module level value can be shared by every transaction that imports the contract. Anything a
+    # transaction could change in place would leak into the next one, so only immutable values qualify.
+    if type(value) in REUSABLE_TYPES or isinstance(value, ModuleType):
+        return True
+
+    if isinstance(value, tuple):
+        return all(is_reusable(v) for v in value)
+
+    if isinstance(value, FunctionType):
+        return is_reusable(value.__defaults__) and is_reusable(tuple((value.__kwdefaults__ or {}).values()))
+
+    if isinstance(value, Datum):
+        return is_reusable(getattr(value, '_default_value', None))
+
+    return False
+
+
+# Names bound for every transaction besides the ones in its environment. A module body that reads any of them can
+# compute its values from the transaction, so its scope can't be kept for the next one.
+TRANSACTION_NAMES = {'ctx', 'rt', 'random'}
+
+
+def body_names(code):
+    # Names read while the module body runs, including the comprehensions it evaluates. The bodies of the functions and
+    # lambdas it defines only run when they are called, against the environment of the calling transaction.
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, CodeType) and const.co_name.startswith('<') and const.co_name != '<lambda>':
+            names.update(body_names(const))
+    return names
+
+
+class CachedModule:
+    def __init__(self, code, read_size=0):
+        self.code = code
+        self.names = body_names(code)
+
+        # What reading the compiled code from state is charged, so that importing the module costs the same whether it
+        # is cached or not
+        self.read_size = read_size
+
+        # Set once the module body has been executed under metering without touching state. The scope is the dict the
+        # contract's functions use as their globals, defined holds the names the module body bound in it and cost the
+        # stamps its execution used, not counting the contracts it imported.
+        self.scope = None
+        self.defined = None
+        self.cost = 0
+
+
+def cache_compiled(name, code, code_hash=None):
+    # Modules are cached under the hash in the manifest of their contract. Contracts submitted before manifests were
+    # recorded are cached under the hash of their compiled code instead.
+    k, v = encode_kv(make_key(name, COMPILED_KEY), code)
+
+    if type(code) != bytes:
+        code = bytes.fromhex(code)
+
+    if code_hash is None:
+        code_hash = hashlib.sha3_256(code).hexdigest()
+
+    cached = MODULE_CACHE.get(name, code_hash)
+    if cached is None:
+        cached = CachedModule(marshal.loads(code), len(k) + len(v))
+        MODULE_CACHE.put(name, code_hash, cached)
+
+    return cached
+
+
+def preload_modules(names, driver):
+    # Reads the manifests of the contracts, then the code of every one that is not cached under its hash yet, each in one
+    # batch, so importing them does not go to the database
+    manifests = driver.get_many([driver.make_key(name, MANIFEST_KEY) for name in names], mark=False)
+
+    hashes = {}
+    for name in names:
+        manifest = manifests[driver.make_key(name, MANIFEST_KEY)]
+        if manifest is None:
+            hashes[name] = None
+        elif MODULE_CACHE.get(name, manifest['hash']) is None:
+            hashes[name] = manifest['hash']
+
+    values = driver.get_many([driver.make_key(name, COMPILED_KEY) for name in hashes], mark=False)
+
+    for name, code_hash in hashes.items():
+        code = values[driver.make_key(name, COMPILED_KEY)]
+        if code is not None:
+            cache_compiled(name, code, code_hash)
+
+            if driver.metrics is not None:
+                driver.metrics.counter(MODULE_LOADS).inc()
+
+
+# Stamps used by the imports nested in each module that is currently being loaded
+_nested_costs = []
 
 
 class DatabaseLoader(Loader):
@@ -95,30 +200,50 @@ class DatabaseLoader(Loader):
         return None
 
     def exec_module(self, module):
-        # fetch the individual contract
-        code = MODULE_CACHE.get(module.__name__)
+        # The manifest is read on every import, as it has the hash of the code the module may be cached under. Reading
+        # the code is charged on a cache hit too, so a transaction uses the same stamps whatever this node has cached.
+        manifest = self.d.get_manifest(module.__name__)
+
+        cached = None
+        if manifest is not None:
+            cached = MODULE_CACHE.get(module.__name__, manifest['hash'])
 
-        if MODULE_CACHE.get(module.__name__) is None:
+        if cached is None:
             code = self.d.get_compiled(module.__name__)
             if code is None:
                 raise ImportError("Module {} not found".format(module.__name__))
 
-            if type(code) != bytes:
-                code = bytes.fromhex(code)
+            cached = cache_compiled(module.__name__, code, None if manifest is None else manifest['hash'])
 
-            code = marshal.loads(code)
-            MODULE_CACHE[module.__name__] = code
+            if self.d.metrics is not None:
+                self.d.metrics.counter(MODULE_LOADS).inc()
 
-        if code is None:
-            raise ImportError("Module {} not found".format(module.__name__))
+        else:
+            rt.deduct_read_size(cached.read_size)
 
-        scope = env.gather()
-        scope.update(rt.env)
+            if self.d.metrics is not None:
+                self.d.metrics.counter(MODULE_CACHE_HITS).inc()
+
+        _nested_costs.append(0)
+        before = rt.tracer.get_stamp_used()
 
-        scope.update({'__contract__': True})
+        defined = None
+        try:
+            if cached.scope is None:
+                scope, defined = self._execute_body(module.__name__, cached)
+            else:
+                scope = self._restore(module.__name__, cached)
+        finally:
+            cost = rt.tracer.get_stamp_used() - before
+            nested = _nested_costs.pop()
+            if len(_nested_costs) > 0:
+                _nested_costs[-1] += cost
 
-        # execute the module with the std env and update the module to pass forward
-        exec(code, scope)
+        # Charged again on every reuse, so that a transaction uses the same stamps whether the module was cached or not
+        if defined is not None:
+            cached.scope = scope
+            cached.defined = defined
+            cached.cost = cost - nested
 
         # Update the module's attributes with the new scope
         vars(module).update(scope)
@@ -126,5 +251,73 @@ class DatabaseLoader(Loader):
 
         rt.loaded_modules.append(module.__name__)
 
+    def _base_scope(self, name, scope):
+        scope.update(env.gather())
+        scope.update(rt.env)
+
+        scope.update({'__contract__': True, '__name__': name})
+
+        return scope
+
+    def _execute_body(self, name, cached):
+        scope = self._base_scope(name, {})
+        initial = dict(scope)
+
+        # Track what the module body touches. Only a body that does not read or write state (besides importing other
+        # contracts) always leaves the same scope behind, so only then can its scope be kept for later transactions.
+        metered = rt.tracer.is_started()
+
+        reads = self.d.reads
+        self.d.reads = set()
+        self.d.begin()
+
+        try:
+            # execute the module with the std env and update the module to pass forward
+            exec(cached.code, scope)
+        finally:
+            writes = self.d.merge()
+            body_reads = self.d.reads
+            self.d.reads = reads
+            reads.update(body_reads)
+
+        if not metered or len(writes) > 0:
+            return scope, None
+
+        if not cached.names.isdisjoint(TRANSACTION_NAMES) or not cached.names.isdisjoint(rt.env):
+            return scope, None
+
+        for key in body_reads:
+            if not key.endswith(CODE_KEY) and not key.endswith(COMPILED_KEY):
+                return scope, None
+
+        defined = {k: v for k, v in scope.items() if k not in initial or initial[k] is not v}
+
+        for k, v in defined.items():
+            if k != '__builtins__' and not is_reusable(v):
+                return scope, None
+
+        return scope, defined
+
+    def _restore(self, name, cached):
+        # The functions of the contract are bound to this scope, so refill it in place with the current environment
+        scope = cached.scope
+        scope.clear()
+
+        self._base_scope(name, scope)
+        scope.update(cached.defined)
+
+        if rt.tracer.is_started():
+            rt.tracer.add_cost(cached.cost)
+
+        driver = rt.env.get('__Driver')
+
+        for k, v in cached.defined.items():
+            if isinstance(v, ModuleType):
+                scope[k] = importlib.import_module(v.__name__)
+            elif isinstance(v, Datum) and driver is not None:
+                v._driver = driver
+
+        return scope
+
     def module_repr(self, module):
         return '<module {!r} (smart contract)>'.format(module.__name__)
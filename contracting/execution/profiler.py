@@ -0,0 +1,119 @@
+import sys
+import time
+from contracting.execution.runtime import rt, Runtime
+
+# Cost is in tracer units, of which 1000 make up a stamp. Lines counts the metered lines, not opcodes.
+METRICS = ('cost', 'time', 'lines', 'reads', 'read_bytes', 'writes', 'write_bytes')
+
+
+class Profiler:
+    # Collects the metrics above for every contract function a transaction runs. They are kept per call stack of
+    # 'contract.function' names, so a cross contract call shows up under the function that made it. Cost, lines, reads
+    # and writes are only measured when the transaction is metered.
+    def __init__(self):
+        self.stack = []
+        self.stacks = {}
+
+        self.reads = 0
+        self.read_bytes = 0
+        self.writes = 0
+        self.write_bytes = 0
+
+        self.previous = None
+
+    def start(self):
+        self.previous = sys.getprofile()
+        Runtime.profiler = self
+        sys.setprofile(self._profile)
+
+    def stop(self):
+        sys.setprofile(self.previous)
+        Runtime.profiler = None
+
+        # Frames are still open if the tracer stopped the transaction from inside them
+        while len(self.stack) > 0:
+            self._pop()
+
+    def read(self, size):
+        self.reads += 1
+        self.read_bytes += size
+
+    def write(self, size):
+        self.writes += 1
+        self.write_bytes += size
+
+    def _counters(self):
+        return (
+            rt.tracer.get_stamp_used(),
+            time.perf_counter(),
+            rt.tracer.get_line_count(),
+            self.reads,
+            self.read_bytes,
+            self.writes,
+            self.write_bytes
+        )
+
+    def _profile(self, frame, event, arg):
+        if event != 'call' and event != 'return':
+            return
+
+        f_globals = frame.f_globals
+        if f_globals.get('__contract__') is not True:
+            return
+
+        if event == 'call':
+            # Named after the module the code lives in, which is the contract that defined the function
+            name = '{}.{}'.format(f_globals['__name__'], frame.f_code.co_name)
+            path = name if len(self.stack) == 0 else '{};{}'.format(self.stack[-1]['path'], name)
+
+            self.stack.append({
+                'frame': frame,
+                'path': path,
+                'start': self._counters(),
+                'children': [0] * len(METRICS)
+            })
+
+        elif len(self.stack) > 0 and self.stack[-1]['frame'] is frame:
+            self._pop()
+
+    def _pop(self):
+        entry = self.stack.pop()
+
+        total = [now - start for now, start in zip(self._counters(), entry['start'])]
+        own = [t - c for t, c in zip(total, entry['children'])]
+
+        if len(self.stack) > 0:
+            parent = self.stack[-1]['children']
+            for i, t in enumerate(total):
+                parent[i] += t
+
+        stats = self.stacks.get(entry['path'])
+        if stats is None:
+            stats = {
+                'calls': 0,
+                'total': dict.fromkeys(METRICS, 0),
+                'self': dict.fromkeys(METRICS, 0)
+            }
+            self.stacks[entry['path']] = stats
+
+        stats['calls'] += 1
+        for metric, t, o in zip(METRICS, total, own):
+            stats['total'][metric] += t
+            stats['self'][metric] += o
+
+    def results(self):
+        return self.stacks
+
+
+def folded_stacks(profile, metric='cost'):
+    # The folded format of flamegraph.pl and compatible tools: one 'a;b;c value' line per stack, with the value the
+    # stack spent in its own top frame. Time is given in microseconds as the format only takes integers.
+    lines = []
+    for path, stats in sorted(profile.items()):
+        value = stats['self'][metric]
+        if metric == 'time':
+            value = value * 1000000
+
+        lines.append('{} {}'.format(path, int(value)))
+
+    return '\n'.join(lines)
@@ -2,6 +2,7 @@ import sys
 from contracting import config
 import contracting
 import os
+from collections import OrderedDict
 from contracting.execution.metering.tracer import Tracer
 
 
@@ -58,6 +59,66 @@ _context = Context({
 
 WRITE_MAX = 1024 * 32
 
+
+class ModuleCache:
+    # Contract modules kept between transactions, keyed by contract name and the hash of their code. Entries are always
+    # looked up by the hash in the current manifest of the contract, so a process that did not see the contract change
+    # never runs its old code. Names are only tracked to tell which contracts have an entry.
+    def __init__(self, max_entries=config.MODULE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.names = {}
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def get(self, name, code_hash):
+        entry = self.entries.get((name, code_hash))
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end((name, code_hash))
+        self.names[name] = code_hash
+        self.hits += 1
+
+        return entry
+
+    def put(self, name, code_hash, entry):
+        if self.max_entries <= 0:
+            return
+
+        self.names[name] = code_hash
+        self.entries[(name, code_hash)] = entry
+        self.entries.move_to_end((name, code_hash))
+
+        while len(self.entries) > self.max_entries:
+            (evicted_name, evicted_hash), _ = self.entries.popitem(last=False)
+            if self.names.get(evicted_name) == evicted_hash:
+                del self.names[evicted_name]
+            self.evictions += 1
+
+    def invalidate(self, name):
+        self.names.pop(name, None)
+
+    def clear(self):
+        self.names.clear()
+        self.entries.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'max_entries': self.max_entries
+        }
+
+
 class Runtime:
     cu_path = contracting.__path__[0]
     cu_path = os.path.join(cu_path, 'execution', 'metering', 'cu_costs.const')
@@ -66,6 +127,8 @@ class Runtime:
 
     loaded_modules = []
 
+    module_cache = ModuleCache()
+
     env = {}
     stamps = 0
 
@@ -77,6 +140,9 @@ class Runtime:
 
     context = _context
 
+    # Set while an opt-in profiler is collecting the reads and writes of a transaction
+    profiler = None
+
     @classmethod
     def set_up(cls, stmps, meter):
         if meter:
@@ -104,10 +170,20 @@ class Runtime:
 
     @classmethod
     def deduct_read(cls, key, value):
+        cls.deduct_read_size(len(key) + len(value))
+
+    @classmethod
+    def deduct_read_size(cls, size):
         if cls.tracer.is_started():
-            cost = len(key) + len(value)
-            cost *= config.READ_COST_PER_BYTE
-            cls.tracer.add_cost(cost)
+            if cls.profiler is not None:
+                cls.profiler.read(size)
+
+            cls.tracer.add_cost(size * config.READ_COST_PER_BYTE)
+
+    @classmethod
+    def deduct_hash(cls, size):
+        if cls.tracer.is_started():
+            cls.tracer.add_cost(config.HASH_COST + size * config.HASH_COST_PER_BYTE)
 
     @classmethod
     def deduct_write(cls, key, value):
@@ -115,6 +191,9 @@ class Runtime:
             cost = len(key) + len(value)
             cls.writes += cost
 
+            if cls.profiler is not None:
+                cls.profiler.write(cost)
+
             assert cls.writes < WRITE_MAX, 'You have exceeded the maximum write capacity per transaction!'
 
             stamp_cost = cost * config.WRITE_COST_PER_BYTE
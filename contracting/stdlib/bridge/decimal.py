@@ -30,15 +30,13 @@ MIN_DECIMAL = Decimal(make_min_decimal_str(MAX_LOWER_PRECISION))
 
 
 def should_round(x: Decimal):
+    # Whether str(x) has more than MAX_LOWER_PRECISION - 1 characters after its point. In terms of the exponent, that
+    # is an exponent of -MAX_LOWER_PRECISION or less when str uses plain notation, or, in scientific notation, more than
+    # one digit with the fraction and the exponent together that long. Finding the point decides the same without
+    # as_tuple, whose tuple of digits costs more to build than the string.
     s = str(x)
-
-    try:
-        upper, lower = s.split('.')
-    except ValueError:
-        return False
-
-    if len(lower) > MAX_LOWER_PRECISION - 1:
-        return True
+    point = s.find('.')
+    return point >= 0 and len(s) - point > MAX_LOWER_PRECISION
 
 
 def fix_precision(x: Decimal):
@@ -48,22 +46,39 @@ def fix_precision(x: Decimal):
     if should_round(x):
         return x.quantize(MIN_DECIMAL, rounding=decimal.ROUND_FLOOR).normalize()
 
-    return ContractingDecimal(x)
+    return _wrap(x)
+
+
+def _wrap(d: Decimal):
+    # Skips the type checks of __init__ for values that are already Decimals
+    c = object.__new__(ContractingDecimal)
+    c._d = d
+    return c
 
 
 class ContractingDecimal:
+    # Instances are shared between the caches of the driver, so they are never changed in place. The augmented
+    # assignment operators return a new value like their binary counterparts.
+    __slots__ = ('_d', )
+
     def _get_other(self, other):
-        if type(other) == ContractingDecimal:
+        t = type(other)
+        if t == ContractingDecimal:
             return other._d
-        elif type(other) == float or type(other) == int:
+        elif t == int:
+            return Decimal(other)
+        elif t == float:
             return Decimal(str(other))
         return other
 
     def __init__(self, a):
-        if type(a) == float or type(a) == int:
-            self._d = Decimal(str(a))
-        elif type(a) == Decimal:
+        t = type(a)
+        if t == Decimal:
             self._d = a
+        elif t == int:
+            self._d = Decimal(a)
+        elif t == float:
+            self._d = Decimal(str(a))
         else:
             self._d = Decimal(a)
 
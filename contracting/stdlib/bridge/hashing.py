@@ -1,42 +1,112 @@
 import hashlib
+import re
 from types import ModuleType
+from contracting.execution.runtime import rt
 
 '''
 Bytes can't be stored in JSON so we use hex-strings converted into bytes and back.
+
+sha3 and sha256 take a hex string if the whole string is valid hex and hash its text otherwise. The typed entry points
+(sha3_hex, sha3_str, sha3_bytes and their sha256 counterparts) skip that guess, and sha3_many / sha256_many hash a list
+of values in one call. Hashes through these newer entry points are charged config.HASH_COST plus
+config.HASH_COST_PER_BYTE for each byte hashed. sha3 and sha256 stay free, as deployed contracts were priced without it.
 '''
 
+HEX_PAIRS = re.compile('(?:[0-9a-fA-F]{2})*')
+WHITESPACE = re.compile(r'\s')
+
+
+def _guess_bytes(value):
+    if HEX_PAIRS.fullmatch(value) is not None:
+        return bytes.fromhex(value)
+
+    # fromhex also skips whitespace between the hex pairs
+    if WHITESPACE.search(value) is not None:
+        try:
+            return bytes.fromhex(value)
+        except ValueError:
+            pass
+
+    return value.encode()
+
+
+def _hex_bytes(hex_str: str):
+    assert HEX_PAIRS.fullmatch(hex_str) is not None, 'Not a hex string!'
+    return bytes.fromhex(hex_str)
+
+
+def _str_bytes(s: str):
+    assert type(s) == str, 'Not a string!'
+    return s.encode()
+
+
+def _bytes(b: bytes):
+    assert type(b) == bytes, 'Not bytes!'
+    return b
+
+
+def _any_bytes(value):
+    if type(value) == bytes:
+        return value
+    return _guess_bytes(value)
+
+
+def _hash(algorithm, byte_str):
+    rt.deduct_hash(len(byte_str))
+    return algorithm(byte_str).hexdigest()
+
 
 def sha3(hex_str: str):
-    try:
-        byte_str = bytes.fromhex(hex_str)
-    except ValueError:
-        byte_str = hex_str.encode()
+    return hashlib.sha3_256(_guess_bytes(hex_str)).hexdigest()
+
+
+def sha3_hex(hex_str: str):
+    return _hash(hashlib.sha3_256, _hex_bytes(hex_str))
+
+
+def sha3_str(s: str):
+    return _hash(hashlib.sha3_256, _str_bytes(s))
 
-    hasher = hashlib.sha3_256()
-    hasher.update(byte_str)
 
-    hashed_bytes = hasher.digest()
+def sha3_bytes(b: bytes):
+    return _hash(hashlib.sha3_256, _bytes(b))
 
-    return hashed_bytes.hex()
+
+def sha3_many(values: list):
+    return [_hash(hashlib.sha3_256, _any_bytes(v)) for v in values]
 
 
 def sha256(hex_str: str):
-    try:
-        byte_str = bytes.fromhex(hex_str)
-    except ValueError:
-        byte_str = hex_str.encode()
+    return hashlib.sha256(_guess_bytes(hex_str)).hexdigest()
+
+
+def sha256_hex(hex_str: str):
+    return _hash(hashlib.sha256, _hex_bytes(hex_str))
+
+
+def sha256_str(s: str):
+    return _hash(hashlib.sha256, _str_bytes(s))
+
 
-    hasher = hashlib.sha256()
-    hasher.update(byte_str)
+def sha256_bytes(b: bytes):
+    return _hash(hashlib.sha256, _bytes(b))
 
-    hashed_bytes = hasher.digest()
 
-    return hashed_bytes.hex()
+def sha256_many(values: list):
+    return [_hash(hashlib.sha256, _any_bytes(v)) for v in values]
 
 
 hashlib_module = ModuleType('hashlib')
 hashlib_module.sha3 = sha3
+hashlib_module.sha3_hex = sha3_hex
+hashlib_module.sha3_str = sha3_str
+hashlib_module.sha3_bytes = sha3_bytes
+hashlib_module.sha3_many = sha3_many
 hashlib_module.sha256 = sha256
+hashlib_module.sha256_hex = sha256_hex
+hashlib_module.sha256_str = sha256_str
+hashlib_module.sha256_bytes = sha256_bytes
+hashlib_module.sha256_many = sha256_many
 
 exports = {
     'hashlib': hashlib_module,
@@ -2,7 +2,7 @@ import importlib
 from types import FunctionType, ModuleType
 from contracting.config import PRIVATE_METHOD_PREFIX
 from contracting.db.orm import Datum
-from contracting.db.driver import ContractDriver, OWNER_KEY
+from contracting.db.driver import ContractDriver
 from contracting.execution.runtime import rt
 from stdlib_list import stdlib_list
 import sys
@@ -56,7 +56,7 @@ def import_module(name):
     if name.startswith('_'):
         raise ImportError
 
-    if _driver.get_contract(name) is None:
+    if not _driver.contract_exists(name):
         raise ImportError
 
     m = importlib.import_module(name, package=None)
@@ -85,8 +85,7 @@ def enforce_interface(m: ModuleType, interface: list):
 
 def owner_of(m: ModuleType):
     _driver = rt.env.get('__Driver') or ContractDriver()
-    owner = _driver.get_var(m.__name__, OWNER_KEY)
-    return owner
+    return _driver.get_owner(m.__name__)
 
 
 imports_module = ModuleType('importlib')
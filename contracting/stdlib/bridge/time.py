@@ -26,17 +26,40 @@ def get_raw_seconds(weeks, days, hours, minutes, seconds):
 
 
 class Datetime:
+    # Only the wrapped datetime is stored. The fields are read from it when they are accessed.
+    __slots__ = ('_datetime', )
+
     def __init__(self, year, month, day, hour=0, minute=0, second=0, microsecond=0):
         self._datetime = dt(year=year, month=month, day=day, hour=hour,
                             minute=minute, second=second, microsecond=microsecond)
 
-        self.year = self._datetime.year
-        self.month = self._datetime.month
-        self.day = self._datetime.day
-        self.hour = self._datetime.hour
-        self.minute = self._datetime.minute
-        self.second = self._datetime.second
-        self.microsecond = self._datetime.microsecond
+    @property
+    def year(self):
+        return self._datetime.year
+
+    @property
+    def month(self):
+        return self._datetime.month
+
+    @property
+    def day(self):
+        return self._datetime.day
+
+    @property
+    def hour(self):
+        return self._datetime.hour
+
+    @property
+    def minute(self):
+        return self._datetime.minute
+
+    @property
+    def second(self):
+        return self._datetime.second
+
+    @property
+    def microsecond(self):
+        return self._datetime.microsecond
 
     def __lt__(self, other):
         if type(other) != Datetime:
@@ -68,10 +91,13 @@ class Datetime:
             return False
         return self._datetime != other._datetime
 
+    def __hash__(self):
+        return hash(self._datetime)
+
     def __sub__(self, other):
         if isinstance(other, Datetime):
             delta = self._datetime - other._datetime
-            return Timedelta(days=delta.days, seconds=delta.seconds)
+            return Timedelta._from_parts(delta.days, delta.seconds)
         return NotImplemented
 
     def __add__(self, other):
@@ -87,16 +113,20 @@ class Datetime:
 
     @classmethod
     def _from_datetime(cls, d: dt):
-        return cls(year=d.year,
-                   month=d.month,
-                   day=d.day,
-                   hour=d.hour,
-                   minute=d.minute,
-                   second=d.second,
-                   microsecond=d.microsecond)
+        # Naive datetimes are wrapped as they are. Anything else is rebuilt from its fields, dropping the time zone.
+        if type(d) != dt or d.tzinfo is not None:
+            d = dt(year=d.year, month=d.month, day=d.day, hour=d.hour,
+                   minute=d.minute, second=d.second, microsecond=d.microsecond)
+
+        c = object.__new__(cls)
+        c._datetime = d
+        return c
 
 
 class Timedelta:
+    # Only the wrapped timedelta and its total seconds are stored. The components are computed when they are accessed.
+    __slots__ = ('_timedelta', '_raw_seconds')
+
     def __init__(self, weeks=0,
                        days=0,
                        hours=0,
@@ -105,8 +135,15 @@ class Timedelta:
 
         self._timedelta = td(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
 
-        # For fast access to how many hours are in a timedelta.
-        self.__raw_seconds = get_raw_seconds(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+        # Kept as given, so a float argument gives float seconds
+        self._raw_seconds = get_raw_seconds(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+    @classmethod
+    def _from_parts(cls, days, seconds):
+        c = object.__new__(cls)
+        c._timedelta = td(days=days, seconds=seconds)
+        c._raw_seconds = get_raw_seconds(weeks=0, days=days, hours=0, minutes=0, seconds=seconds)
+        return c
 
     def __lt__(self, other):
         if type(other) != Timedelta:
@@ -138,26 +175,29 @@ class Timedelta:
             return False
         return self._timedelta != other._timedelta
 
+    def __hash__(self):
+        return hash(self._timedelta)
+
     # Operator implementations inspired by CPython implementations
     def __add__(self, other):
         if isinstance(other, Timedelta):
-            return Timedelta(days=self._timedelta.days + other._timedelta.days,
-                             seconds=self._timedelta.seconds + other._timedelta.seconds)
+            return Timedelta._from_parts(self._timedelta.days + other._timedelta.days,
+                                         self._timedelta.seconds + other._timedelta.seconds)
         return NotImplemented
 
     def __sub__(self, other):
         if isinstance(other, Timedelta):
-            return Timedelta(days=self._timedelta.days - other._timedelta.days,
-                             seconds=self._timedelta.seconds - other._timedelta.seconds,)
+            return Timedelta._from_parts(self._timedelta.days - other._timedelta.days,
+                                         self._timedelta.seconds - other._timedelta.seconds)
         return NotImplemented
 
     def __mul__(self, other):
         if isinstance(other, Timedelta):
-            return Timedelta(days=self._timedelta.days * other._timedelta.days,
-                             seconds=self._timedelta.seconds * other._timedelta.seconds)
+            return Timedelta._from_parts(self._timedelta.days * other._timedelta.days,
+                                         self._timedelta.seconds * other._timedelta.seconds)
         elif isinstance(other, int):
-            return Timedelta(days=self._timedelta.days * other,
-                             seconds=self._timedelta.seconds * other)
+            return Timedelta._from_parts(self._timedelta.days * other,
+                                         self._timedelta.seconds * other)
         return NotImplemented
 
     def __str__(self):
@@ -169,23 +209,23 @@ class Timedelta:
     # Accesses raw seconds and does a simple modulo to get the number of the component in the total seconds
     @property
     def seconds(self):
-        return self.__raw_seconds
+        return self._raw_seconds
 
     @property
     def minutes(self):
-        return self.__raw_seconds // SECONDS_IN_MINUTE
+        return self._raw_seconds // SECONDS_IN_MINUTE
 
     @property
     def hours(self):
-        return self.__raw_seconds // SECONDS_IN_HOUR
+        return self._raw_seconds // SECONDS_IN_HOUR
 
     @property
     def days(self):
-        return self.__raw_seconds // SECONDS_IN_DAY
+        return self._raw_seconds // SECONDS_IN_DAY
 
     @property
     def weeks(self):
-        return self.__raw_seconds // SECONDS_IN_WEEK
+        return self._raw_seconds // SECONDS_IN_WEEK
 
 
 WEEKS = Timedelta(weeks=1)
@@ -48,6 +48,9 @@ setup(
     description='Python-based smart contract language and interpreter.',
     packages=find_packages(),
     install_requires=requirements,
+    extras_require={
+        'lmdb': ['lmdb'],
+    },
     url='https://github.com/Lamden/contracting',
     author='Lamden',
     author_email='team@lamden.io',
@@ -283,4 +283,20 @@ class TestComplexContracts(TestCase):
 
         h = sha256()
         h.update(bytes.fromhex(secret))
-        self.assertEqual(h.hexdigest(), s3['result'])
\ No newline at end of file
+        self.assertEqual(h.hexdigest(), s3['result'])
+
+    def test_hash_sha3_many_and_typed_works(self):
+        e = Executor(metering=False)
+
+        e.execute(**TEST_SUBMISSION_KWARGS,
+                  kwargs=submission_kwargs_for_file('./test_contracts/test_hashing_works.s.py'))
+
+        secrets = ['c0d1cc254c2aca8716c6ef170630550d', 'hello']
+        many = e.execute('colin', 'test_hashing_works', 't_sha3_many', kwargs={'values': secrets})
+
+        self.assertEqual(many['result'], [sha3_256(bytes.fromhex(secrets[0])).hexdigest(),
+                                          sha3_256(b'hello').hexdigest()])
+
+        typed = e.execute('colin', 'test_hashing_works', 't_sha3_str', kwargs={'s': secrets[0]})
+
+        self.assertEqual(typed['result'], sha3_256(secrets[0].encode()).hexdigest())
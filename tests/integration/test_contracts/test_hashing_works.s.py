@@ -5,3 +5,11 @@ def t_sha3(s: str):
 @export
 def t_sha256(s: str):
     return hashlib.sha256(s)
+
+@export
+def t_sha3_many(values: list):
+    return hashlib.sha3_many(values)
+
+@export
+def t_sha3_str(s: str):
+    return hashlib.sha3_str(s)
@@ -1,7 +1,12 @@
 from unittest import TestCase
-from contracting.db.driver import ContractDriver
+from contracting.db.driver import ContractDriver, InMemDriver, SQLiteDriver
 from contracting.execution.executor import Executor
 from contracting.compilation.compiler import ContractingCompiler
+from contracting.execution.module import MODULE_CACHE
+from contracting.execution.profiler import folded_stacks
+from contracting.execution import metrics
+import os
+import tempfile
 
 
 def submission_kwargs_for_file(f):
@@ -306,3 +311,570 @@ def get_v():
         output = e.execute('stu', 'i_use_env', 'env_var', kwargs={}, environment=env)
 
         self.assertEqual(output['status_code'], 1)
+
+    def test_execute_block_runs_transactions_in_order_and_commits_once(self):
+        e = Executor(metering=False)
+
+        e.execute(**TEST_SUBMISSION_KWARGS,
+                  kwargs=submission_kwargs_for_file('./test_contracts/erc20_clone.s.py'), auto_commit=True)
+
+        txs = [
+            {'sender': 'stu', 'contract_name': 'erc20_clone', 'function_name': 'transfer',
+             'kwargs': {'amount': 100, 'to': 'raghu'}},
+            {'sender': 'raghu', 'contract_name': 'erc20_clone', 'function_name': 'transfer',
+             'kwargs': {'amount': 40, 'to': 'colin'}},
+        ]
+
+        results = e.execute_block(txs)
+
+        self.assertEqual([r['status_code'] for r in results], [0, 0])
+        self.assertDictEqual(results[1]['tx_writes'], {
+            'erc20_clone.balances:raghu': 60,
+            'erc20_clone.balances:colin': 140
+        })
+        # All writes pending so far in the block, not only this transaction's
+        self.assertEqual(results[1]['writes']['erc20_clone.balances:stu'], 999900)
+        self.assertEqual(results[1]['writes']['erc20_clone.balances:raghu'], 60)
+
+        self.assertEqual(self.d.driver.get('erc20_clone.balances:stu'), 999900)
+        self.assertEqual(self.d.driver.get('erc20_clone.balances:raghu'), 60)
+        self.assertEqual(self.d.driver.get('erc20_clone.balances:colin'), 140)
+
+    def test_execute_block_rolls_back_failed_transaction(self):
+        e = Executor(metering=False)
+
+        code = '''v = Variable()
+
+@export
+def set_v(i: int):
+    v.set(i)
+    assert i < 10, 'Too big!'
+'''
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'rollback', 'code': code}, auto_commit=True)
+
+        txs = [
+            {'sender': 'stu', 'contract_name': 'rollback', 'function_name': 'set_v', 'kwargs': {'i': 5}},
+            {'sender': 'stu', 'contract_name': 'rollback', 'function_name': 'set_v', 'kwargs': {'i': 50}},
+            {'sender': 'stu', 'contract_name': 'rollback', 'function_name': 'set_v', 'kwargs': {'i': 7}},
+            {'sender': 'stu', 'contract_name': 'rollback', 'function_name': 'set_v', 'kwargs': {'i': 70}},
+        ]
+
+        results = e.execute_block(txs)
+
+        self.assertEqual([r['status_code'] for r in results], [0, 1, 0, 1])
+        self.assertDictEqual(results[1]['tx_writes'], {})
+        self.assertEqual(results[1]['writes']['rollback.v'], 5)
+        self.assertEqual(self.d.driver.get('rollback.v'), 7)
+
+    def test_execute_block_fails_invalid_transaction_on_its_own(self):
+        e = Executor(metering=False)
+
+        code = '''v = Variable()
+
+@export
+def set_v(i: int):
+    v.set(i)
+
+@export
+def reset():
+    v.set(0)
+
+def f():
+    v.set(-1)
+'''
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'invalid', 'code': code}, auto_commit=True)
+
+        txs = [
+            {'sender': 'stu', 'contract_name': 'invalid', 'function_name': 'set_v', 'kwargs': {'i': 5}},
+            {'sender': 'stu', 'contract_name': 'invalid', 'function_name': '__f', 'kwargs': {}},
+            {'sender': 'stu', 'contract_name': 'invalid', 'function_name': 'set_v', 'kwargs': {'i': 7}},
+            # No kwargs at all means none are passed
+            {'sender': 'stu', 'contract_name': 'invalid', 'function_name': 'reset'},
+        ]
+
+        results = e.execute_block(txs)
+
+        self.assertEqual([r['status_code'] for r in results], [0, 1, 0, 0])
+        self.assertIsInstance(results[1]['result'], AssertionError)
+        self.assertDictEqual(results[2]['tx_writes'], {'invalid.v': 7})
+        self.assertEqual(self.d.driver.get('invalid.v'), 0)
+
+    def sqlite_executor(self):
+        # Parallel execution needs storage the worker processes can open as well
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        driver = ContractDriver(driver=SQLiteDriver(filename=os.path.join(directory.name, 'state.db')))
+        self.addCleanup(driver.driver.db.close)
+
+        with open('../../contracting/contracts/submission.s.py') as f:
+            driver.set_contract(name='submission', code=f.read())
+        driver.commit()
+
+        e = Executor(metering=False, driver=driver)
+        self.addCleanup(e.close)
+
+        return e
+
+    def test_execute_block_parallel_matches_serial_execution(self):
+        e = self.sqlite_executor()
+
+        e.execute(**TEST_SUBMISSION_KWARGS,
+                  kwargs=submission_kwargs_for_file('./test_contracts/erc20_clone.s.py'), auto_commit=True)
+
+        txs = [
+            {'sender': 'stu', 'contract_name': 'erc20_clone', 'function_name': 'transfer',
+             'kwargs': {'amount': 100, 'to': 'raghu'}},
+            {'sender': 'colin', 'contract_name': 'erc20_clone', 'function_name': 'transfer',
+             'kwargs': {'amount': 10, 'to': 'tejas'}},
+            # Depends on the first transaction, so it must be re-executed after validation
+            {'sender': 'raghu', 'contract_name': 'erc20_clone', 'function_name': 'transfer',
+             'kwargs': {'amount': 40, 'to': 'colin'}},
+        ]
+
+        results = e.execute_block(txs, processes=2)
+
+        self.assertEqual([r['status_code'] for r in results], [0, 0, 0])
+        self.assertDictEqual(results[1]['tx_writes'], {
+            'erc20_clone.balances:colin': 90,
+            'erc20_clone.balances:tejas': 10
+        })
+        self.assertEqual(results[1]['writes']['erc20_clone.balances:stu'], 999900)
+        self.assertEqual(results[1]['writes']['erc20_clone.balances:tejas'], 10)
+
+        backing = e.driver.driver
+        self.assertEqual(backing.get('erc20_clone.balances:stu'), 999900)
+        self.assertEqual(backing.get('erc20_clone.balances:raghu'), 60)
+        self.assertEqual(backing.get('erc20_clone.balances:colin'), 130)
+        self.assertEqual(backing.get('erc20_clone.balances:tejas'), 10)
+
+    def test_execute_block_parallel_keeps_workers_between_blocks(self):
+        e = self.sqlite_executor()
+
+        e.execute(**TEST_SUBMISSION_KWARGS,
+                  kwargs=submission_kwargs_for_file('./test_contracts/erc20_clone.s.py'), auto_commit=True)
+
+        tx = {'sender': 'stu', 'contract_name': 'erc20_clone', 'function_name': 'transfer',
+              'kwargs': {'amount': 100, 'to': 'raghu'}}
+
+        e.execute_block([tx], processes=2)
+        pool = e._pool
+
+        # The workers read the state the first block committed
+        results = e.execute_block([tx, tx], processes=2)
+
+        self.assertIs(e._pool, pool)
+        self.assertEqual([r['status_code'] for r in results], [0, 0])
+        self.assertEqual(e.driver.driver.get('erc20_clone.balances:raghu'), 300)
+
+    def test_execute_block_parallel_reexecutes_output_that_cannot_be_pickled(self):
+        e = self.sqlite_executor()
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'unpicklable', 'code': '''
+h = Hash()
+
+@export
+def handle(i: int):
+    h[i] = i
+    return h
+'''}, auto_commit=True)
+
+        txs = [{'sender': 'stu', 'contract_name': 'unpicklable', 'function_name': 'handle', 'kwargs': {'i': i}}
+               for i in range(2)]
+
+        results = e.execute_block(txs, processes=2)
+
+        self.assertEqual([r['status_code'] for r in results], [0, 0])
+        self.assertEqual(e.driver.driver.get('unpicklable.h:1'), 1)
+
+    def test_execute_block_parallel_detects_reads_of_pending_writes(self):
+        e = self.sqlite_executor()
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'pending', 'code': '''
+v = Variable()
+w = Variable()
+
+@export
+def set_v(i: int):
+    v.set(i)
+
+@export
+def copy_v():
+    w.set(v.get())
+'''}, auto_commit=True)
+
+        # Left uncommitted, so the workers only see it through the pending writes of the block
+        e.execute('stu', 'pending', 'set_v', kwargs={'i': 1})
+
+        txs = [
+            {'sender': 'stu', 'contract_name': 'pending', 'function_name': 'set_v', 'kwargs': {'i': 2}},
+            {'sender': 'stu', 'contract_name': 'pending', 'function_name': 'copy_v', 'kwargs': {}},
+        ]
+
+        results = e.execute_block(txs, processes=2)
+
+        self.assertEqual([r['status_code'] for r in results], [0, 0])
+        self.assertEqual(e.driver.driver.get('pending.w'), 2)
+
+    def test_execute_block_parallel_runs_resubmitted_code(self):
+        e = self.sqlite_executor()
+
+        code = '''
+v = Variable()
+
+@export
+def set_v():
+    v.set({})
+'''
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'changing', 'code': code.format(1)}, auto_commit=True)
+
+        tx = {'sender': 'stu', 'contract_name': 'changing', 'function_name': 'set_v', 'kwargs': {}}
+        e.execute_block([tx, tx], processes=2)
+
+        self.assertEqual(e.driver.driver.get('changing.v'), 1)
+
+        e.driver.delete_contract('changing')
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'changing', 'code': code.format(2)}, auto_commit=True)
+
+        e.execute_block([tx, tx], processes=2)
+
+        self.assertEqual(e.driver.driver.get('changing.v'), 2)
+
+    def test_execute_block_parallel_refuses_in_memory_state(self):
+        e = Executor(metering=False, driver=ContractDriver(driver=InMemDriver()))
+        self.addCleanup(e.close)
+
+        with self.assertRaises(AssertionError):
+            e.execute_block([], processes=2)
+
+    def test_failed_transaction_writes_are_rolled_back(self):
+        e = Executor(metering=False)
+
+        code = '''v = Variable()
+
+@export
+def set_v(i: int):
+    v.set(i)
+    assert i < 10, 'Too big!'
+'''
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'rollback', 'code': code})
+
+        output = e.execute('stu', 'rollback', 'set_v', kwargs={'i': 5})
+        self.assertDictEqual(output['tx_writes'], {'rollback.v': 5})
+        self.assertEqual(output['writes']['rollback.v'], 5)
+        self.assertIn('rollback.__code__', output['writes'])
+
+        output = e.execute('stu', 'rollback', 'set_v', kwargs={'i': 50})
+        self.assertEqual(output['status_code'], 1)
+        self.assertDictEqual(output['tx_writes'], {})
+        self.assertEqual(output['writes']['rollback.v'], 5)
+
+        self.assertEqual(e.driver.get('rollback.v'), 5)
+
+    def test_cached_module_does_not_share_mutable_state_between_transactions(self):
+        e = Executor()
+
+        code = '''seen = []
+
+@export
+def append(i: int):
+    seen.append(i)
+    return len(seen)
+'''
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'mutable', 'code': code}, metering=False)
+        e.driver.set('currency.balances:stu', 1000000)
+
+        first = e.execute('stu', 'mutable', 'append', kwargs={'i': 1})
+        second = e.execute('stu', 'mutable', 'append', kwargs={'i': 2})
+
+        self.assertEqual(first['result'], 1)
+        self.assertEqual(second['result'], 1)
+
+    def test_cached_module_is_rebound_to_current_environment(self):
+        e = Executor(metering=False)
+
+        code = '''v = Variable()
+
+@export
+def set_block(i: int):
+    v.set(block_num + i)
+'''
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'environment', 'code': code})
+        e.driver.set('currency.balances:stu', 1000000)
+
+        e.execute('stu', 'environment', 'set_block', kwargs={'i': 1}, environment={'block_num': 10}, metering=True)
+        e.execute('stu', 'environment', 'set_block', kwargs={'i': 1}, environment={'block_num': 20}, metering=True)
+
+        self.assertEqual(e.driver.get('environment.v'), 21)
+
+    def test_module_values_computed_from_the_transaction_are_not_reused(self):
+        e = Executor(metering=False)
+
+        code = '''seen_at = block_num
+first_caller = ctx.caller
+
+@export
+def seen():
+    return [seen_at, first_caller]
+'''
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'seen', 'code': code}, environment={'block_num': 0})
+        e.driver.set('currency.balances:stu', 1000000)
+        e.driver.set('currency.balances:bob', 1000000)
+
+        first = e.execute('stu', 'seen', 'seen', kwargs={}, environment={'block_num': 10}, metering=True)
+        second = e.execute('bob', 'seen', 'seen', kwargs={}, environment={'block_num': 20}, metering=True)
+        third = e.execute('bob', 'seen', 'seen', kwargs={}, environment={'block_num': 30}, metering=True)
+
+        self.assertListEqual(first['result'], [10, 'stu'])
+        self.assertListEqual(second['result'], [20, 'bob'])
+        self.assertListEqual(third['result'], [30, 'bob'])
+
+    def test_execute_block_preloads_dependency_closure(self):
+        e = Executor(metering=False)
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'leaf', 'code': '''
+@export
+def value():
+    return 1
+'''})
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'middle', 'code': '''
+@export
+def value():
+    return importlib.import_module('leaf').value() + 1
+'''})
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'root', 'code': '''
+import middle
+
+@export
+def value():
+    return middle.value() + 1
+'''})
+
+        MODULE_CACHE.clear()
+
+        self.assertSetEqual(e._dependency_closure(['root'], e.driver), {'root', 'middle', 'leaf'})
+
+        results = e.execute_block([{'sender': 'stu', 'contract_name': 'root', 'function_name': 'value', 'kwargs': {}}])
+
+        self.assertEqual(results[0]['result'], 3)
+        self.assertIn('leaf', MODULE_CACHE)
+
+    def test_imports_cost_the_same_with_a_cold_or_warm_cache(self):
+        e = Executor(metering=False)
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'leaf', 'code': '''
+@export
+def value():
+    return 1
+'''})
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'caller', 'code': '''
+@export
+def call(name: str):
+    return importlib.import_module(name).value()
+'''})
+
+        e.driver.set('currency.balances:stu', 1000000)
+        e.driver.commit()
+        e.driver.clear_pending_state()
+
+        MODULE_CACHE.clear()
+        cold = e.execute('stu', 'caller', 'call', kwargs={'name': 'leaf'}, metering=True, profile=True)
+        e.driver.clear_pending_state()
+
+        warm = e.execute('stu', 'caller', 'call', kwargs={'name': 'leaf'}, metering=True, profile=True)
+
+        self.assertEqual(cold['result'], 1)
+        self.assertEqual(cold['stamps_used'], warm['stamps_used'])
+
+        cold_total = cold['profile']['caller.call']['total']
+        warm_total = warm['profile']['caller.call']['total']
+        for metric in ('cost', 'reads', 'read_bytes'):
+            self.assertEqual(cold_total[metric], warm_total[metric])
+
+    def test_profile_records_cross_contract_calls(self):
+        e = Executor(metering=False)
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'leaf', 'code': '''
+v = Variable()
+
+@export
+def value():
+    v.set(1)
+    return v.get()
+'''})
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'root', 'code': '''
+import leaf
+
+@export
+def value():
+    return helper() + 1
+
+def helper():
+    return leaf.value() + leaf.value()
+'''})
+
+        e.driver.set('currency.balances:stu', 1000000)
+
+        output = e.execute('stu', 'root', 'value', kwargs={}, metering=True, profile=True)
+        profile = output['profile']
+
+        self.assertEqual(output['result'], 3)
+
+        self.assertEqual(profile['root.value']['calls'], 1)
+        self.assertEqual(profile['root.value;root.__helper']['calls'], 1)
+        self.assertEqual(profile['root.value;root.__helper;leaf.value']['calls'], 2)
+
+        leaf = profile['root.value;root.__helper;leaf.value']
+        self.assertEqual(leaf['total']['writes'], 2)
+        self.assertEqual(leaf['total']['reads'], 2)
+
+        root = profile['root.value']
+        self.assertGreater(root['total']['cost'], root['self']['cost'])
+        self.assertGreater(root['total']['lines'], 0)
+
+        folded = folded_stacks(profile).split('\n')
+        self.assertIn('root.value;root.__helper;leaf.value {}'.format(leaf['self']['cost']), folded)
+
+    def test_execute_without_profile_has_no_profile(self):
+        e = Executor(metering=False)
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'leaf', 'code': '''
+@export
+def value():
+    return 1
+'''})
+
+        output = e.execute('stu', 'leaf', 'value', kwargs={})
+
+        self.assertNotIn('profile', output)
+
+    def test_metrics_report_transactions_cache_and_modules(self):
+        registry = metrics.Registry()
+        e = Executor(metering=False, metrics=registry)
+
+        # Instrumenting must not touch the backing driver every other ContractDriver shares by default
+        self.assertIsNone(ContractDriver().driver.metrics)
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'leaf', 'code': '''
+v = Variable()
+
+@export
+def value():
+    v.set(1)
+    return v.get()
+'''})
+
+        e.driver.set('currency.balances:stu', 1000000)
+        e.driver.commit()
+        e.driver.clear_pending_state()
+
+        MODULE_CACHE.clear()
+        registry.clear()
+
+        e.execute('stu', 'leaf', 'value', kwargs={}, metering=True)
+        e.execute('stu', 'leaf', 'value', kwargs={}, metering=True)
+        e.execute('stu', 'leaf', 'nope', kwargs={}, metering=True)
+
+        snapshot = registry.snapshot()
+
+        self.assertEqual(snapshot[metrics.TX_TOTAL], 3)
+        self.assertEqual(snapshot[metrics.TX_FAILED], 1)
+        self.assertEqual(snapshot[metrics.TX_SECONDS]['count'], 3)
+        self.assertEqual(snapshot[metrics.TRACED_SECONDS]['count'], 3)
+        self.assertGreater(snapshot[metrics.TRACED_LINES], 0)
+
+        self.assertEqual(snapshot[metrics.MODULE_LOADS], 1)
+        self.assertEqual(snapshot[metrics.MODULE_CACHE_HITS], 3)
+
+        self.assertGreater(snapshot[metrics.CACHE_HITS], 0)
+        self.assertGreater(snapshot[metrics.CACHE_MISSES], 0)
+        self.assertGreaterEqual(snapshot[metrics.DRIVER_GET_SECONDS]['count'], snapshot[metrics.CACHE_MISSES])
+        self.assertGreater(snapshot[metrics.CACHE_HIT_RATIO], 0)
+        self.assertGreater(snapshot[metrics.BYTES_DECODED], 0)
+
+        e.driver.commit()
+
+        snapshot = registry.snapshot()
+        self.assertGreater(snapshot[metrics.BYTES_ENCODED], 0)
+        self.assertEqual(snapshot[metrics.DRIVER_SET_SECONDS]['count'], 1)
+
+        self.assertIn('contracting_tx_total 3\n', registry.prometheus())
+
+    def test_hash_iter_in_contract_charges_for_items_consumed(self):
+        e = Executor(metering=False)
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'pages', 'code': '''
+h = Hash()
+
+@export
+def fill(n: int):
+    for i in range(n):
+        h['{:03d}'.format(i)] = '{:0>256}'.format(i)
+
+@export
+def page(limit: int, start_after: str):
+    return [[k, v] for k, v in h.iter(limit=limit, start_after=start_after)]
+'''})
+        e.execute('stu', 'pages', 'fill', kwargs={'n': 50})
+        e.driver.commit()
+        e.driver.clear_pending_state()
+
+        e.driver.set('currency.balances:stu', 1000000)
+
+        first = e.execute('stu', 'pages', 'page', kwargs={'limit': 2, 'start_after': None}, metering=True)
+        self.assertListEqual([k for k, v in first['result']], ['000', '001'])
+
+        e.driver.clear_pending_state()
+        e.driver.set('currency.balances:stu', 1000000)
+
+        rest = e.execute('stu', 'pages', 'page', kwargs={'limit': 0, 'start_after': '001'}, metering=True)
+        self.assertEqual(len(rest['result']), 48)
+        self.assertEqual(rest['result'][0][0], '002')
+
+        self.assertLess(first['stamps_used'], rest['stamps_used'])
+
+    def test_hash_clear_in_contract_is_not_charged_for_values(self):
+        e = Executor(metering=False)
+
+        e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'table', 'code': '''
+small = Hash()
+large = Hash()
+
+@export
+def fill(n: int):
+    for i in range(n):
+        small[i] = 0
+        large[i] = 'x' * 1000
+
+@export
+def reset(name: str):
+    if name == 'small':
+        small.clear()
+    else:
+        large.clear()
+'''})
+        e.execute('stu', 'table', 'fill', kwargs={'n': 20})
+        e.driver.commit()
+        e.driver.clear_pending_state()
+
+        stamps = {}
+        for name in ('small', 'large'):
+            e.driver.set('currency.balances:stu', 1000000)
+            output = e.execute('stu', 'table', 'reset', kwargs={'name': name}, metering=True)
+            stamps[name] = output['stamps_used']
+
+        self.assertEqual(stamps['small'], stamps['large'])
+
+        e.driver.commit()
+        self.assertListEqual(e.driver.driver.iter('table.large:'), [])
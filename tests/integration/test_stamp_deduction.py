@@ -4,6 +4,8 @@ from contracting.execution.executor import Executor
 from contracting.config import STAMPS_PER_TAU
 from contracting.execution import runtime
 import contracting
+import psutil
+import resource
 
 def submission_kwargs_for_file(f):
     # Get the file name only by splitting off directories
@@ -60,6 +62,62 @@ class TestMetering(TestCase):
 
         self.assertEqual(float(prior_balance - new_balance - 100), output['stamps_used'] / STAMPS_PER_TAU)
 
+    def test_cached_module_uses_same_stamps_as_executing_it(self):
+        self.e.execute('stu', 'currency', 'transfer', kwargs={'amount': 100, 'to': 'colin'}, auto_commit=True)
+
+        cached = runtime.rt.module_cache.get('currency', self.d.get_manifest('currency')['hash'])
+        self.assertIsNotNone(cached.scope)
+
+        reused = self.e.execute('stu', 'currency', 'transfer', kwargs={'amount': 100, 'to': 'colin'}, auto_commit=True)
+
+        cached.scope = None
+        cached.defined = None
+
+        executed = self.e.execute('stu', 'currency', 'transfer', kwargs={'amount': 100, 'to': 'colin'}, auto_commit=True)
+
+        self.assertEqual(reused['stamps_used'], executed['stamps_used'])
+        self.assertIsNotNone(cached.scope)
+
+    def test_import_uses_same_stamps_with_a_cold_or_warm_module_cache(self):
+        self.e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'leaf', 'code': '''
+padding = '{}'
+
+@export
+def value():
+    return 1
+'''.format('x' * 5000)}, metering=False, auto_commit=True)
+
+        self.e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'caller', 'code': '''
+@export
+def call(name: str):
+    return importlib.import_module(name).value()
+'''}, metering=False, auto_commit=True)
+
+        runtime.rt.module_cache.clear()
+        cold = self.e.execute('stu', 'caller', 'call', kwargs={'name': 'leaf'}, auto_commit=True)
+
+        warm = self.e.execute('stu', 'caller', 'call', kwargs={'name': 'leaf'}, auto_commit=True)
+
+        self.assertEqual(cold['result'], 1)
+        self.assertEqual(cold['stamps_used'], warm['stamps_used'])
+
+    def test_short_function_allocating_too_much_memory_fails(self):
+        self.e.execute(**TEST_SUBMISSION_KWARGS, kwargs={'name': 'allocate', 'code': '''
+@export
+def allocate(size: int):
+    a = 'x' * size
+    return len(a)
+'''}, metering=False, auto_commit=True)
+
+        # Memory is metered on the growth of the peak resident size of the process, so go 200 MB past the peak so far
+        process = psutil.Process()
+        size = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - process.memory_info().rss + 200 * 1024 * 1024
+
+        output = self.e.execute('stu', 'allocate', 'allocate', kwargs={'size': size}, auto_commit=True)
+
+        self.assertEqual(output['status_code'], 1)
+        self.assertIn('exceeded memory usage', str(output['result']))
+
     def test_too_few_stamps_fails_and_deducts_properly(self):
         prior_balance = self.d.get('currency.balances:stu')
 
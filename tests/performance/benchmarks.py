@@ -0,0 +1,320 @@
+import argparse
+import json
+import os
+import platform
+import secrets
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+from contracting.db.driver import ContractDriver, Driver, InMemDriver, SQLiteDriver
+from contracting.db.encoder import encode_for_storage, decode, CODEC_JSON, CODEC_BINARY
+from contracting.execution.executor import Executor
+from contracting.execution.module import uninstall_database_loader
+from contracting.stdlib.bridge.decimal import ContractingDecimal
+from contracting.stdlib.bridge.time import Datetime
+
+# Benchmarks of the hot paths of the executor. Each one runs against a fresh ContractDriver on top of one of the backing
+# drivers in DRIVERS and reports one result per measured operation. Run it with
+#
+#   python tests/performance/benchmarks.py --drivers memory mongomock --iterations 1000 --output results.json
+#
+# and compare the results of two runs to track regressions.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SUBMISSION = os.path.join(ROOT, '..', '..', 'contracting', 'contracts', 'submission.s.py')
+ERC20 = os.path.join(ROOT, '..', 'integration', 'test_contracts', 'erc20_clone.s.py')
+ELECTION_HOUSE = os.path.join(ROOT, '..', 'governance', 'contracts', 'election_house.s.py')
+
+SENDER = 'stu'
+
+POLICY = '''
+value = Variable()
+votes = Hash()
+
+@construct
+def seed():
+    value.set(0)
+
+@export
+def vote(vk: str, obj: Any):
+    votes[vk] = obj
+    value.set(obj)
+
+@export
+def current_value():
+    return value.get()
+'''
+
+SCANNED = '''
+items = Hash(default_value=0)
+
+@export
+def fill(n: int):
+    for i in range(n):
+        items[i] = i
+
+@export
+def total():
+    return sum(items.all())
+'''
+
+SUBMITTED = '''
+balances = Hash(default_value=0)
+owner = Variable()
+
+@construct
+def seed():
+    owner.set(ctx.caller)
+    balances[ctx.caller] = 1000
+
+@export
+def transfer(amount: int, to: str):
+    assert balances[ctx.caller] >= amount, 'Not enough coins to send!'
+    balances[ctx.caller] -= amount
+    balances[to] += amount
+'''
+
+ENCODED = {
+    'int': 123456789,
+    'str': 'a' * 64,
+    'decimal': ContractingDecimal('1234.5678'),
+    'time': Datetime(2020, 1, 1, 12, 30),
+    'list': [1, 2, 3, 'four', {'five': 5}],
+    'bytes': b'\x00\x01\x02' * 16
+}
+
+SCANNED_ITEMS = 100
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+@contextmanager
+def memory_driver():
+    yield InMemDriver()
+
+
+@contextmanager
+def sqlite_driver():
+    with tempfile.TemporaryDirectory() as directory:
+        driver = SQLiteDriver(filename=os.path.join(directory, 'bench.db'))
+        yield driver
+        driver.db.close()
+
+
+@contextmanager
+def mongo_driver():
+    # Needs a mongod listening on the default port
+    driver = Driver(db='contracting_benchmarks')
+    driver.flush()
+    yield driver
+    driver.flush()
+
+
+@contextmanager
+def mongomock_driver():
+    # The Mongo driver against an in process stand in for mongod. Requires the optional mongomock package.
+    if mongomock is None:
+        raise ImportError('The mongomock driver requires the mongomock package.')
+
+    with mongomock.patch(servers=(('localhost', 27017), )):
+        driver = Driver(db='contracting_benchmarks')
+        yield driver
+
+
+DRIVERS = {
+    'memory': memory_driver,
+    'sqlite': sqlite_driver,
+    'mongo': mongo_driver,
+    'mongomock': mongomock_driver
+}
+
+
+class Bench:
+    def __init__(self, backing):
+        self.driver = ContractDriver(driver=backing)
+        self.driver.flush()
+
+        self.driver.set_contract(name='submission', code=read(SUBMISSION))
+        self.driver.commit()
+
+        self.executor = Executor(driver=self.driver, metering=False)
+
+    def execute(self, contract, function, kwargs, sender=SENDER, metering=False):
+        output = self.executor.execute(sender=sender,
+                                       contract_name=contract,
+                                       function_name=function,
+                                       kwargs=kwargs,
+                                       metering=metering)
+
+        if output['status_code'] != 0:
+            raise AssertionError('{}.{} failed: {}'.format(contract, function, output['result']))
+
+        return output
+
+    def submit(self, name, code, owner=None):
+        self.execute('submission', 'submit_contract', {'name': name, 'code': code, 'owner': owner})
+
+    def fund(self, sender=SENDER):
+        # Balance to pay for metered transactions with
+        self.driver.set('currency.balances:{}'.format(sender), 100000000)
+
+    def settle(self):
+        self.driver.commit()
+        self.driver.clear_pending_state()
+
+
+def measure(name, iterations, fn):
+    # fn is called with the index of every iteration. Returns a result record.
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    seconds = time.perf_counter() - start
+
+    return {
+        'benchmark': name,
+        'iterations': iterations,
+        'seconds': seconds,
+        'per_second': iterations / seconds if seconds > 0 else None,
+        'mean_us': seconds / iterations * 1000000
+    }
+
+
+def bench_transfer(bench, iterations):
+    bench.submit('erc20_clone', read(ERC20))
+    bench.fund()
+    bench.settle()
+
+    recipients = [secrets.token_hex(16) for _ in range(iterations)]
+
+    results = []
+    for metering in (False, True):
+        name = 'transfer_metered' if metering else 'transfer_unmetered'
+        results.append(measure(name, iterations, lambda i: bench.execute(
+            'erc20_clone', 'transfer', {'amount': 1, 'to': recipients[i]}, metering=metering)))
+        bench.settle()
+
+    return results
+
+
+def bench_cross_contract(bench, iterations):
+    bench.submit('election_house', read(ELECTION_HOUSE))
+    bench.submit('policy', POLICY, owner='election_house')
+    bench.execute('election_house', 'register_policy', {'contract': 'policy'})
+    bench.fund()
+    bench.settle()
+
+    results = [
+        measure('cross_contract_vote', iterations, lambda i: bench.execute(
+            'election_house', 'vote', {'policy': 'policy', 'value': i}, metering=True)),
+        measure('cross_contract_read', iterations, lambda i: bench.execute(
+            'election_house', 'current_value_for_policy', {'policy': 'policy'}, metering=True))
+    ]
+    bench.settle()
+
+    return results
+
+
+def bench_hash_scan(bench, iterations):
+    bench.submit('scanned', SCANNED)
+    bench.execute('scanned', 'fill', {'n': SCANNED_ITEMS})
+    bench.settle()
+
+    def scan(i):
+        # Scan the committed state rather than the pending writes of earlier iterations
+        bench.driver.clear_pending_state()
+        bench.execute('scanned', 'total', {})
+
+    result = measure('hash_all_{}'.format(SCANNED_ITEMS), iterations, scan)
+    bench.settle()
+
+    return [result]
+
+
+def bench_submission(bench, iterations):
+    result = measure('submission', iterations, lambda i: bench.submit('submitted_{}'.format(i), SUBMITTED))
+    bench.settle()
+
+    return [result]
+
+
+def bench_encoder(bench, iterations):
+    results = []
+    for codec, name in ((CODEC_JSON, 'json'), (CODEC_BINARY, 'binary')):
+        results.append(measure('encode_{}'.format(name), iterations,
+                               lambda i: encode_for_storage(ENCODED, codec, as_bytes=True)))
+
+        encoded = encode_for_storage(ENCODED, codec, as_bytes=True)
+        results.append(measure('decode_{}'.format(name), iterations, lambda i: decode(encoded)))
+
+    return results
+
+
+BENCHMARKS = {
+    'transfer': bench_transfer,
+    'cross_contract': bench_cross_contract,
+    'hash_scan': bench_hash_scan,
+    'submission': bench_submission,
+    'encoder': bench_encoder
+}
+
+
+def run(drivers=('memory', ), benchmarks=tuple(BENCHMARKS), iterations=1000):
+    assert iterations >= 1, 'Benchmarks need at least one iteration.'
+
+    results = []
+    for driver in drivers:
+        for benchmark in benchmarks:
+            with DRIVERS[driver]() as backing:
+                bench = Bench(backing)
+                try:
+                    for result in BENCHMARKS[benchmark](bench, iterations):
+                        result['driver'] = driver
+                        results.append(result)
+                finally:
+                    bench.driver.flush()
+                    # The executor leaves the database loader pointing at this driver, which is closed on exit
+                    uninstall_database_loader()
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.time(),
+        'results': results
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the contracting executor')
+    parser.add_argument('--drivers', nargs='+', default=['memory'], choices=sorted(DRIVERS))
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--output', help='File to write the JSON results to instead of stdout')
+    args = parser.parse_args(argv)
+
+    if args.iterations < 1:
+        parser.error('--iterations must be at least 1')
+
+    report = run(args.drivers, args.benchmarks, args.iterations)
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return report
+
+
+if __name__ == '__main__':
+    main()
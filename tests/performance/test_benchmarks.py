@@ -0,0 +1,42 @@
+from unittest import TestCase
+import json
+import os
+import tempfile
+from tests.performance import benchmarks
+
+
+class TestBenchmarks(TestCase):
+    def test_every_benchmark_runs_and_reports(self):
+        report = benchmarks.run(drivers=['memory'], iterations=2)
+
+        names = {r['benchmark'] for r in report['results']}
+        self.assertSetEqual(names, {
+            'transfer_unmetered', 'transfer_metered',
+            'cross_contract_vote', 'cross_contract_read',
+            'hash_all_{}'.format(benchmarks.SCANNED_ITEMS),
+            'submission',
+            'encode_json', 'decode_json', 'encode_binary', 'decode_binary'
+        })
+
+        for result in report['results']:
+            self.assertEqual(result['driver'], 'memory')
+            self.assertEqual(result['iterations'], 2)
+            self.assertGreater(result['seconds'], 0)
+
+    def test_main_writes_json(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.json')
+            benchmarks.main(['--benchmarks', 'encoder', '--iterations', '1', '--output', path])
+
+            with open(path) as f:
+                report = json.load(f)
+
+        self.assertEqual(len(report['results']), 4)
+
+    def test_run_needs_an_iteration(self):
+        with self.assertRaises(AssertionError):
+            benchmarks.run(drivers=['memory'], benchmarks=['encoder'], iterations=0)
+
+    def test_main_rejects_no_iterations(self):
+        with self.assertRaises(SystemExit):
+            benchmarks.main(['--benchmarks', 'encoder', '--iterations', '0'])
@@ -10,6 +10,18 @@ class TestClient(TestCase):
     def tearDown(self):
         self.client.flush()
 
+    def test_iter_var_pages_through_hash(self):
+        for i in range(5):
+            self.client.set_var('con', 'balances', ['acct{}'.format(i)], value=i)
+        self.client.set_var('con', 'other', ['acct0'], value=100)
+        self.client.raw_driver.commit()
+
+        page = list(self.client.iter_var('con', 'balances', limit=2))
+        self.assertListEqual(page, [('acct0', 0), ('acct1', 1)])
+
+        page = list(self.client.iter_var('con', 'balances', limit=2, start_after=page[-1][0]))
+        self.assertListEqual(page, [('acct2', 2), ('acct3', 3)])
+
     def test_set_submission_updates_contract_file(self):
         submission_1_code = self.client.raw_driver.get('submission.__code__')
 
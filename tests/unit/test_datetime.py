@@ -1,7 +1,7 @@
 from unittest import TestCase
 from contracting.stdlib.bridge.time import Datetime, Timedelta
 from datetime import datetime as dt
-from datetime import timedelta
+from datetime import timedelta, timezone
 
 
 class TestDatetime(TestCase):
@@ -162,4 +162,33 @@ class TestDatetime(TestCase):
         d = Datetime(2019, 1, 1)
         e = Datetime(2018, 1, 1)
 
-        self.assertEqual((d - e), Timedelta(days=365))
\ No newline at end of file
+        self.assertEqual((d - e), Timedelta(days=365))
+
+    def test_datetime_is_hashable(self):
+        d = Datetime(2019, 1, 1, 12)
+        e = Datetime(2019, 1, 1, 12)
+
+        self.assertEqual(hash(d), hash(e))
+        self.assertEqual(len({d, e, Datetime(2019, 1, 2)}), 2)
+
+    def test_datetime_fields_are_read_only(self):
+        d = Datetime(2019, 1, 1)
+
+        with self.assertRaises(AttributeError):
+            d.year = 2020
+
+        with self.assertRaises(AttributeError):
+            d.x = 1
+
+    def test_from_datetime_wraps_naive_datetime(self):
+        now = dt.now()
+        d = Datetime._from_datetime(now)
+
+        self.assertEqual(d, Datetime(now.year, now.month, now.day, now.hour, now.minute, now.second, now.microsecond))
+        self.assertEqual(d.microsecond, now.microsecond)
+
+    def test_from_datetime_drops_time_zone(self):
+        d = Datetime._from_datetime(dt(2019, 1, 1, 12, tzinfo=timezone.utc))
+
+        self.assertEqual(d, Datetime(2019, 1, 1, 12))
+        self.assertIsNone(d._datetime.tzinfo)
@@ -162,3 +162,49 @@ class TestDecimal(TestCase):
     def test_contracting_decimal_can_round(self):
         s = '12345678901234567890123456789.123456789012345678901234567890'
         self.assertEqual(round(Decimal(s), 10), round(ContractingDecimal(s), 10))
+
+    def test_should_round_counts_exponent_of_scientific_notation(self):
+        # str gives 1.2345678901234567890123456789012E-10, with 35 characters after the point
+        self.assertTrue(should_round(Decimal('1.2345678901234567890123456789012E-10')))
+        self.assertFalse(should_round(Decimal('1.2345E-10')))
+
+    def test_should_round_integers_and_exponents_without_point(self):
+        self.assertFalse(should_round(Decimal('1000000')))
+        self.assertFalse(should_round(Decimal('1E-40')))
+
+    def test_should_round_at_limit(self):
+        self.assertFalse(should_round(Decimal('0.' + '1' * 29)))
+        self.assertTrue(should_round(Decimal('0.' + '1' * 30)))
+
+    def test_should_round_follows_exponent(self):
+        # The rule str(x) follows: plain notation when the exponent is at most 0 and the adjusted exponent at least -6
+        def by_exponent(x):
+            sign, digits, exponent = x.as_tuple()
+            adjusted = exponent + len(digits) - 1
+            if exponent <= 0 and adjusted >= -6:
+                return exponent <= -30
+            return len(digits) > 1 and len(digits) + 1 + len(str(abs(adjusted))) >= 30
+
+        for coefficient in (0, 1, 7, 12, 10 ** 8 + 1, 10 ** 25 + 3, 10 ** 26 + 3, 10 ** 29 + 1, 10 ** 59 + 1):
+            for exponent in range(-95, 40):
+                x = Decimal(coefficient).scaleb(exponent)
+                self.assertEqual(should_round(x), by_exponent(x), str(x))
+
+    def test_int_operand_same_as_str(self):
+        a = ContractingDecimal('10.5')
+        self.assertEqual(str(a - 12345678901234567890), str(a - ContractingDecimal('12345678901234567890')))
+
+    def test_augmented_assignment_does_not_change_shared_value(self):
+        a = ContractingDecimal('1.5')
+        b = a
+
+        b += 1
+        b *= 2
+
+        self.assertEqual(a, ContractingDecimal('1.5'))
+        self.assertEqual(b, ContractingDecimal('5'))
+        self.assertEqual(type(b), ContractingDecimal)
+
+    def test_has_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            ContractingDecimal('1').x = 1
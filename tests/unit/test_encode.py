@@ -1,5 +1,6 @@
-from unittest import TestCase
-from contracting.db.encoder import encode, decode, safe_repr
+from unittest import TestCase, skipIf
+from contracting.db import encoder
+from contracting.db.encoder import encode, decode, safe_repr, encode_binary, decode_binary, BINARY_MAGIC
 from contracting.stdlib.bridge.time import Datetime, Timedelta
 from datetime import datetime
 from contracting.stdlib.bridge.decimal import ContractingDecimal
@@ -126,3 +127,100 @@ class TestEncode(TestCase):
         e = encode(b)
 
         print(e)
+
+
+class TestBinaryEncode(TestCase):
+    def assert_same_as_json(self, o):
+        j = decode(encode(o))
+        b = decode(encode_binary(o))
+
+        self.assertEqual(type(j), type(b))
+        self.assertEqual(repr(j), repr(b))
+
+    def test_primitives_decode_like_json(self):
+        for o in [None, True, False, 0, -1, 2 ** 100, -2 ** 70, 'hello', 'üñí', [1, [2, 'a'], {}], (1, 2)]:
+            self.assert_same_as_json(o)
+
+    def test_dict_keys_are_coerced_like_json(self):
+        self.assert_same_as_json({'a': 1, 2: 3, None: 4, False: 5})
+
+    def test_decimals_decode_like_json(self):
+        for o in [1.5, 1e16, 0.1 + 0.2, ContractingDecimal('1.000000000000000000000000000000123'),
+                  ContractingDecimal('100.0000'), ContractingDecimal('-0.5')]:
+            self.assert_same_as_json(o)
+
+    def test_time_types_decode_like_json(self):
+        self.assert_same_as_json(Datetime(2020, 1, 2, 3, 4, 5, 6))
+        self.assert_same_as_json(Timedelta(days=-3, seconds=10))
+
+    def test_bytes_decode_like_json(self):
+        self.assert_same_as_json(b'\x00\xff')
+
+    def test_nested_structures_decode_like_json(self):
+        self.assert_same_as_json({'nested': [Datetime(2000, 1, 1), b'x', ContractingDecimal('5'), {'y': None}]})
+
+    def test_tag_shaped_dicts_decode_like_json(self):
+        self.assert_same_as_json({'__fixed__': '1.5'})
+        self.assert_same_as_json({'__time__': [2020, 1, 2, 3, 4, 5, 6], 'x': 1})
+        self.assert_same_as_json({'__delta__': [1, 20]})
+        self.assert_same_as_json({'__bytes__': '00ff'})
+        self.assert_same_as_json([{'y': {'__fixed__': '2'}}, {'__fixed__': '3', '__other__': 1}])
+
+    def test_binary_is_smaller_than_json(self):
+        o = {'nested': [Datetime(2000, 1, 1), b'x', ContractingDecimal('5'), {'y': None}]}
+        self.assertLess(len(encode_binary(o)), len(encode(o)))
+
+    def test_binary_starts_with_magic(self):
+        self.assertEqual(encode_binary(1)[:1], BINARY_MAGIC)
+
+    def test_decode_detects_format(self):
+        self.assertEqual(decode(encode(1234).encode()), 1234)
+        self.assertEqual(decode(encode_binary(1234)), 1234)
+
+    def test_decode_binary_failure(self):
+        self.assertIsNone(decode_binary(encode_binary('hello')[:-1]))
+        self.assertIsNone(decode_binary(encode_binary('hello') + b'\x00'))
+
+    def test_unknown_type_raises(self):
+        with self.assertRaises(TypeError):
+            encode_binary({1, 2})
+
+
+class TestDecodeObjects(TestCase):
+    def test_tagged_values(self):
+        self.assertEqual(decode('{"__fixed__":"1.5"}'), ContractingDecimal('1.5'))
+        self.assertEqual(decode('{"__time__":[2019,1,1,0,0,0,0]}'), Datetime(2019, 1, 1))
+        self.assertEqual(decode('{"__delta__":[1,30]}'), Timedelta(days=1, seconds=30))
+        self.assertEqual(decode('{"__bytes__":"00ff"}'), b'\x00\xff')
+
+    def test_plain_objects(self):
+        self.assertEqual(decode('{}'), {})
+        self.assertEqual(decode('{"a":1}'), {'a': 1})
+        self.assertEqual(decode('{"a":{"__fixed__":"1.5"},"b":[{"c":1}]}'),
+                         {'a': ContractingDecimal('1.5'), 'b': [{'c': 1}]})
+
+    def test_tag_among_other_keys_is_still_decoded(self):
+        self.assertEqual(decode('{"x":1,"__fixed__":"1.5"}'), ContractingDecimal('1.5'))
+        self.assertEqual(decode('{"__fixed__":"1.5","__time__":[2019,1,1]}'), Datetime(2019, 1, 1))
+
+    def test_floats_decode_to_contracting_decimals(self):
+        self.assertEqual(decode('[1.5,{"a":2.25}]'), [ContractingDecimal('1.5'), {'a': ContractingDecimal('2.25')}])
+
+
+@skipIf(encoder.orjson is None, 'orjson is not installed')
+class TestDecodeOrjson(TestCase):
+    def test_same_as_json(self):
+        documents = [
+            '1', '"a"', 'null', 'true', '[]', '{}',
+            encode({'a': [1, 'b', ContractingDecimal('1.5'), {'c': Datetime(2019, 1, 1)}], 'd': b'\x00'}),
+            encode([Timedelta(days=1), {'x': 1, '__fixed__': '1.5'}]),
+            '1.5', '[1,2.5]', '{"a":{"b":1e5}}', str(2 ** 70), 'NaN', '"\\ud800"', 'invalid'
+        ]
+
+        for document in documents:
+            a = encoder._loads_orjson(document)
+            b = encoder._loads_json(document)
+
+            # repr, as NaN is not equal to itself
+            self.assertEqual(repr(a), repr(b))
+            self.assertEqual(type(a), type(b))
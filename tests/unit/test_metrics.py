@@ -0,0 +1,120 @@
+from unittest import TestCase
+from contracting.db.driver import CacheDriver, InMemDriver
+from contracting.execution import metrics
+
+
+class TestHistogram(TestCase):
+    def test_observe_counts_value_in_first_bucket_that_holds_it(self):
+        h = metrics.Histogram('h', buckets=(1, 5, 10))
+
+        h.observe(1)
+        h.observe(3)
+        h.observe(20)
+
+        self.assertEqual(h.counts, [1, 1, 0, 1])
+        self.assertEqual(h.count, 3)
+        self.assertEqual(h.sum, 24)
+
+    def test_snapshot_buckets_are_cumulative(self):
+        h = metrics.Histogram('h', buckets=(1, 5, 10))
+
+        h.observe(0.5)
+        h.observe(7)
+
+        self.assertEqual(list(h.snapshot()['buckets'].items()), [(1, 1), (5, 1), (10, 2), (float('inf'), 2)])
+
+
+class TestRegistry(TestCase):
+    def test_builtin_metrics_exist_up_front(self):
+        snapshot = metrics.Registry().snapshot()
+
+        self.assertEqual(snapshot[metrics.TX_TOTAL], 0)
+        self.assertEqual(snapshot[metrics.DRIVER_GET_SECONDS]['count'], 0)
+        self.assertEqual(snapshot[metrics.CACHE_HIT_RATIO], 0)
+
+    def test_counter_is_created_once(self):
+        r = metrics.Registry()
+
+        r.counter('c').inc()
+        r.counter('c').inc(2)
+
+        self.assertEqual(r.snapshot()['c'], 3)
+
+    def test_hit_ratio(self):
+        r = metrics.Registry()
+
+        r.counter(metrics.CACHE_HITS).inc(3)
+        r.counter(metrics.CACHE_MISSES).inc(1)
+
+        self.assertEqual(r.snapshot()[metrics.CACHE_HIT_RATIO], 0.75)
+
+    def test_timer_observes_histogram(self):
+        r = metrics.Registry()
+
+        with r.timer('t'):
+            pass
+
+        self.assertEqual(r.snapshot()['t']['count'], 1)
+
+    def test_clear_resets_builtins(self):
+        r = metrics.Registry()
+        r.counter(metrics.TX_TOTAL).inc()
+        r.counter('c')
+
+        r.clear()
+
+        self.assertEqual(r.snapshot()[metrics.TX_TOTAL], 0)
+        self.assertNotIn('c', r.snapshot())
+
+    def test_prometheus_text(self):
+        r = metrics.Registry()
+        r.metrics.clear()
+
+        r.counter('c').inc(2)
+        r.histogram('h', buckets=(0.5, 1)).observe(0.75)
+
+        expected = '''# TYPE c counter
+c 2
+# TYPE h histogram
+h_bucket{le="0.5"} 0
+h_bucket{le="1"} 1
+h_bucket{le="+Inf"} 1
+h_sum 0.75
+h_count 1
+'''
+
+        self.assertEqual(r.prometheus(), expected)
+
+    def test_prometheus_text_has_help_of_builtins(self):
+        text = metrics.Registry().prometheus()
+
+        self.assertIn('# HELP contracting_tx_total Transactions executed.\n# TYPE contracting_tx_total counter\n', text)
+        self.assertIn('contracting_tx_seconds_bucket{le="+Inf"} 0\n', text)
+
+
+class TestDriverMetrics(TestCase):
+    def test_cache_driver_counts_hits_and_misses(self):
+        r = metrics.Registry()
+        d = CacheDriver(driver=InMemDriver(), metrics=r)
+        d.driver.metrics = r
+
+        d.driver.set('a', 1)
+        d.driver.set('b', 2)
+
+        d.get('a')
+        d.get('a')
+        d.get_many(['a', 'b'])
+
+        snapshot = r.snapshot()
+
+        self.assertEqual(snapshot[metrics.CACHE_MISSES], 1)
+        self.assertEqual(snapshot[metrics.CACHE_HITS], 3)
+        self.assertEqual(snapshot[metrics.DRIVER_GET_SECONDS]['count'], 2)
+        self.assertEqual(snapshot[metrics.BYTES_ENCODED], 2)
+        self.assertEqual(snapshot[metrics.BYTES_DECODED], 2)
+
+    def test_no_metrics_by_default(self):
+        d = CacheDriver(driver=InMemDriver())
+
+        self.assertIsNone(d.metrics)
+        self.assertIsNone(d.driver.metrics)
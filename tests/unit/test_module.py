@@ -1,5 +1,6 @@
 from unittest import TestCase
 from contracting.execution.module import *
+from contracting.execution.runtime import ModuleCache
 import types
 import glob
 
@@ -67,6 +68,76 @@ class TestDatabaseLoader(TestCase):
         self.assertEqual(self.dl.module_repr(module), "<module 'howdy' (smart contract)>")
 
 
+class TestModuleCache(TestCase):
+    def setUp(self):
+        self.dl = DatabaseLoader()
+        self.dl.d.flush()
+
+    def tearDown(self):
+        self.dl.d.flush()
+
+    def test_resubmitted_contract_is_loaded_again(self):
+        self.dl.d.set_contract('test', 'b = 1')
+        module = types.ModuleType('test')
+        self.dl.exec_module(module)
+
+        self.assertEqual(module.b, 1)
+
+        self.dl.d.delete_contract('test')
+        self.assertNotIn('test', MODULE_CACHE)
+
+        self.dl.d.set_contract('test', 'b = 2')
+        module = types.ModuleType('test')
+        self.dl.exec_module(module)
+
+        self.assertEqual(module.b, 2)
+
+    def test_invalidated_name_finds_entry_by_code_hash(self):
+        self.dl.d.set_contract('test', 'b = 1')
+        self.dl.exec_module(types.ModuleType('test'))
+
+        manifest = self.dl.d.get_manifest('test')
+        cached = MODULE_CACHE.get('test', manifest['hash'])
+        MODULE_CACHE.invalidate('test')
+
+        self.dl.exec_module(types.ModuleType('test'))
+
+        self.assertIs(MODULE_CACHE.get('test', manifest['hash']), cached)
+
+    def test_preloaded_module_is_cached_under_manifest_hash(self):
+        self.dl.d.set_contract('test', 'b = 1')
+        MODULE_CACHE.invalidate('test')
+
+        preload_modules(['test'], self.dl.d)
+
+        manifest = self.dl.d.get_manifest('test')
+        self.assertIsNotNone(MODULE_CACHE.get('test', manifest['hash']))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ModuleCache(max_entries=2)
+
+        cache.put('a', '1', 'a1')
+        cache.put('b', '1', 'b1')
+        cache.get('a', '1')
+        cache.put('c', '1', 'c1')
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_eviction_of_old_code_keeps_name_bound_to_new_code(self):
+        cache = ModuleCache(max_entries=2)
+
+        cache.put('a', '1', 'a1')
+        cache.put('a', '2', 'a2')
+        cache.put('b', '1', 'b1')
+
+        self.assertIn('a', cache)
+        self.assertIsNone(cache.get('a', '1'))
+        self.assertEqual(cache.get('a', '2'), 'a2')
+
+
 class TestInstallLoader(TestCase):
     def test_install_loader(self):
         uninstall_database_loader()
@@ -1,5 +1,9 @@
 from unittest import TestCase
 from contracting.db.driver import CacheDriver, Driver
+from contracting.db.encoder import encode_kv
+from contracting.execution.runtime import rt
+from copy import deepcopy
+import pickle
 
 
 class TestCacheDriver(TestCase):
@@ -66,4 +70,196 @@ class TestCacheDriver(TestCase):
 
         self.assertFalse(len(self.c.cache) > 0)
         self.assertFalse(len(self.c.reads) > 0)
-        self.assertFalse(len(self.c.pending_writes) > 0)
\ No newline at end of file
+        self.assertFalse(len(self.c.pending_writes) > 0)
+
+    def test_prefetch_does_not_mark_reads_until_get(self):
+        self.d.set('thing', 8999)
+
+        self.c.prefetch(['thing'])
+        self.assertEqual(self.c.prefetched['thing'], 8999)
+        self.assertFalse('thing' in self.c.reads)
+
+        self.d.set('thing', 1)
+
+        self.assertEqual(self.c.get('thing'), 8999)
+        self.assertTrue('thing' in self.c.reads)
+
+    def test_base_is_read_and_marked_but_not_committed(self):
+        self.d.set('thing', 1)
+        self.c.base['thing'] = 2
+
+        self.assertEqual(self.c.get('thing'), 2)
+        self.assertTrue('thing' in self.c.reads)
+
+        self.c.commit()
+        self.assertEqual(self.d.get('thing'), 1)
+
+    def test_get_many_returns_cached_and_db_values(self):
+        self.d.set('thing1', 1)
+        self.c.set('thing2', 2)
+
+        self.assertDictEqual(self.c.get_many(['thing1', 'thing2', 'thing3']),
+                             {'thing1': 1, 'thing2': 2, 'thing3': None})
+
+    def test_cached_size_is_metered_like_encoding(self):
+        self.d.set('thing', 8999)
+
+        rt.set_up(stmps=1000000, meter=True)
+        self.c.get('thing')
+        self.c.get('thing')
+        used = rt.tracer.get_stamp_used()
+        rt.clean_up()
+
+        k, v = encode_kv('thing', 8999)
+        self.assertEqual(used, 2 * (len(k) + len(v)))
+        self.assertEqual(self.c.sizes['thing'], (8999, len(k) + len(v)))
+
+    def test_mutable_values_are_reencoded_on_read(self):
+        self.c.set('thing', [1])
+
+        rt.set_up(stmps=1000000, meter=True)
+        self.c.get('thing').append(2)
+        start = rt.tracer.get_stamp_used()
+        self.c.get('thing')
+        used = rt.tracer.get_stamp_used() - start
+        rt.clean_up()
+
+        k, v = encode_kv('thing', [1, 2])
+        self.assertEqual(used, len(k) + len(v))
+        self.assertIsNone(self.c.sizes.get('thing'))
+
+
+    def test_rollback_restores_values_from_lower_layer(self):
+        self.c.set('thing1', 1)
+
+        self.c.begin()
+        self.c.set('thing1', 2)
+        self.c.set('thing2', 3)
+
+        self.assertEqual(self.c.get('thing1'), 2)
+
+        self.c.rollback()
+
+        self.assertEqual(self.c.get('thing1'), 1)
+        self.assertIsNone(self.c.get('thing2'))
+        self.assertDictEqual(self.c.pending_writes, {'thing1': 1})
+
+    def test_merge_returns_layer_writes(self):
+        self.c.set('thing1', 1)
+
+        self.c.begin()
+        self.c.set('thing2', {'a': [1]})
+        writes = self.c.merge()
+
+        self.assertDictEqual(writes, {'thing2': {'a': [1]}})
+        self.assertDictEqual(self.c.pending_writes, {'thing1': 1, 'thing2': {'a': [1]}})
+
+        # Plain dicts, so callers can copy and serialize them
+        self.assertDictEqual(pickle.loads(pickle.dumps(writes)), writes)
+        self.assertDictEqual(deepcopy(writes), writes)
+
+    def test_mutation_after_set_is_read_and_written_alike(self):
+        self.c.begin()
+        d = {'a': 1}
+        self.c.set('thing', d)
+        d['a'] = 2
+
+        self.assertDictEqual(self.c.get('thing'), {'a': 2})
+
+        writes = self.c.merge()
+        self.assertDictEqual(writes['thing'], {'a': 2})
+
+        self.c.commit()
+        self.assertDictEqual(self.c.driver.get('thing'), {'a': 2})
+
+    def test_layer_writes_are_not_changed_by_later_mutation(self):
+        self.c.begin()
+        self.c.set('thing', [1])
+        writes = self.c.merge()
+
+        self.c.begin()
+        l = self.c.get('thing')
+        l.append(2)
+        self.c.set('thing', l)
+        self.c.rollback()
+
+        self.assertListEqual(writes['thing'], [1])
+        self.assertListEqual(self.c.get('thing'), [1])
+
+    def test_commit_includes_open_layers(self):
+        self.c.set('thing1', 1)
+        self.c.begin()
+        self.c.set('thing2', 2)
+
+        self.c.commit()
+
+        self.assertEqual(self.d.get('thing1'), 1)
+        self.assertEqual(self.d.get('thing2'), 2)
+
+
+class TestReadCache(TestCase):
+    def setUp(self):
+        self.d = Driver()
+        self.d.flush()
+
+        self.c = CacheDriver(self.d, read_cache_size=1024)
+
+    def test_read_cache_survives_clear_pending_state(self):
+        self.d.set('thing', 8999)
+        self.c.get('thing')
+        self.c.clear_pending_state()
+
+        self.d.set('thing', 1)
+
+        self.assertEqual(self.c.get('thing'), 8999)
+        self.assertEqual(self.c.read_cache.hits, 1)
+        self.assertEqual(self.c.read_cache.misses, 1)
+
+    def test_commit_updates_read_cache(self):
+        self.c.get('thing')
+
+        self.c.set('thing', 1234)
+        self.c.commit()
+        self.c.clear_pending_state()
+
+        self.assertEqual(self.c.get('thing'), 1234)
+        self.assertEqual(self.c.read_cache.hits, 1)
+
+    def test_commit_invalidates_mutable_values(self):
+        self.c.get('thing')
+
+        self.c.set('thing', [1, 2])
+        self.c.commit()
+        self.c.clear_pending_state()
+
+        self.assertListEqual(self.c.get('thing'), [1, 2])
+        self.assertEqual(self.c.read_cache.hits, 0)
+
+    def test_mutable_values_are_not_shared(self):
+        self.d.set('thing', [1, 2])
+        self.c.get('thing').append(3)
+        self.c.clear_pending_state()
+
+        self.assertListEqual(self.c.get('thing'), [1, 2])
+        self.assertEqual(self.c.read_cache.hits, 1)
+
+    def test_evicts_least_recently_used_over_budget(self):
+        self.c.read_cache.max_bytes = 40
+
+        for i in range(4):
+            self.d.set('thing{}'.format(i), 'x' * 10)
+
+        self.c.get('thing0')
+        self.c.get('thing1')
+        self.c.get('thing2')
+
+        self.assertEqual(self.c.read_cache.evictions, 1)
+        self.assertLessEqual(self.c.read_cache.bytes, 40)
+        self.assertListEqual(list(self.c.read_cache.entries.keys()), ['thing1', 'thing2'])
+
+    def test_disabled_by_default(self):
+        c = CacheDriver(self.d)
+        self.d.set('thing', 8999)
+        c.get('thing')
+
+        self.assertEqual(c.read_cache.stats()['entries'], 0)
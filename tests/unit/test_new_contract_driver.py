@@ -1,7 +1,9 @@
 from unittest import TestCase
 from contracting.db.driver import ContractDriver, Driver
 from contracting.stdlib.bridge.time import Datetime
+from contracting import config
 
+import hashlib
 import marshal
 from datetime import datetime
 
@@ -156,6 +158,69 @@ class TestContractDriver(TestCase):
         items = self.c.items()
         self.assertDictEqual(items, kvs)
 
+    def test_iter_merges_pending_and_committed_in_order(self):
+        self.d.set('h:a', 1)
+        self.d.set('h:c', 3)
+        self.d.set('h:e', 5)
+        self.d.set('i:a', 0)
+
+        self.c.set('h:b', 2)
+        self.c.set('h:c', 33)
+        self.c.set('h:e', None)
+
+        self.assertListEqual(list(self.c.iter('h:')), [('h:a', 1), ('h:b', 2), ('h:c', 33)])
+        self.assertIn('h:', self.c.prefix_reads)
+
+    def test_iter_limit_and_start_after(self):
+        for i in range(10):
+            self.d.set('h:{}'.format(i), i)
+        self.c.set('h:45', 45)
+
+        self.assertListEqual(list(self.c.iter('h:', limit=3)), [('h:0', 0), ('h:1', 1), ('h:2', 2)])
+        self.assertListEqual(list(self.c.iter('h:', limit=2, start_after='h:4')), [('h:45', 45), ('h:5', 5)])
+        self.assertListEqual(list(self.c.iter('h:', start_after='h:9')), [])
+
+    def test_iter_scans_backing_driver_in_pages(self):
+        page_size = config.ITER_PAGE_SIZE
+        config.ITER_PAGE_SIZE = 3
+        self.addCleanup(setattr, config, 'ITER_PAGE_SIZE', page_size)
+
+        for i in range(10):
+            self.d.set('h:{}'.format(i), i)
+
+        it = self.c.iter('h:')
+        self.assertEqual(next(it), ('h:0', 0))
+
+        # Only the values that were consumed have been read
+        self.assertSetEqual(self.c.reads, {'h:0'})
+
+        self.assertListEqual([v for k, v in it], list(range(1, 10)))
+
+    def test_delete_prefix_deletes_pending_and_committed_keys(self):
+        self.d.set('h:a', 1)
+        self.d.set('h:b', 2)
+        self.d.set('i:a', 3)
+
+        self.c.set('h:c', 4)
+        self.c.delete_prefix('h:')
+
+        self.assertListEqual(list(self.c.iter('h:')), [])
+        self.assertDictEqual(self.c.writes(), {'h:a': None, 'h:b': None, 'h:c': None})
+        self.assertSetEqual(self.c.reads, set())
+
+        self.c.commit()
+
+        self.assertListEqual(self.d.keys(), ['i:a'])
+
+    def test_delete_prefix_rolls_back_with_its_layer(self):
+        self.d.set('h:a', 1)
+
+        self.c.begin()
+        self.c.delete_prefix('h:')
+        self.c.rollback()
+
+        self.assertEqual(self.c.get('h:a'), 1)
+
     def test_items_prefix_in_cache(self):
         kvs_1 = {
             'pref1_899af0b15aa0f227e658c96a24fa890e': 'ece22e0f19e822908b136e391d488ba5',
@@ -381,3 +446,58 @@ print('hello, world!')
         self.assertEqual(self.c.get_owner('test'), 'something')
         self.assertEqual(self.c.get_time_submitted('test'), time)
 
+    def test_set_contract_records_manifest(self):
+        code = 'a = 1'
+
+        self.c.set_contract(name='test', code=code, owner='something')
+
+        self.assertDictEqual(self.c.get_manifest('test'), {
+            'hash': hashlib.sha3_256(code.encode()).hexdigest(),
+            'size': len(code),
+            'owner': 'something',
+            'compiled': True
+        })
+
+    def test_contract_exists_uses_manifest(self):
+        self.c.set_contract(name='test', code='a = 1')
+        self.c.commit()
+        self.c.clear_pending_state()
+
+        self.assertTrue(self.c.contract_exists('test'))
+        self.assertNotIn('test.__code__', self.c.reads)
+        self.assertFalse(self.c.contract_exists('test2'))
+
+    def test_contract_exists_without_manifest(self):
+        self.c.set_var('test', '__code__', value='a = 1')
+        self.c.set_var('test', '__owner__', value='something')
+
+        self.assertTrue(self.c.contract_exists('test'))
+        self.assertEqual(self.c.get_owner('test'), 'something')
+
+    def test_set_contract_records_dependencies(self):
+        code = '''import currency
+
+I = importlib
+
+@export
+def call():
+    I.import_module('exchange')
+'''
+
+        self.c.set_contract(name='test', code=code)
+
+        self.assertListEqual(self.c.get_dependencies('test'), ['currency', 'exchange'])
+
+    def test_delete_contract_only_deletes_its_own_keys(self):
+        self.c.set_contract(name='test', code='a = 1', owner='something')
+        self.c.set_contract(name='test2', code='a = 2', owner='something')
+        self.c.commit()
+
+        self.c.set('test.v', 123)
+
+        self.c.delete_contract('test')
+
+        self.assertIsNone(self.c.get_contract('test'))
+        self.assertIsNone(self.c.get('test.v'))
+        self.assertIsNone(self.d.get('test.v'))
+        self.assertEqual(self.c.get_contract('test2'), 'a = 2')
@@ -1,6 +1,9 @@
-from unittest import TestCase
-from contracting.db.driver import Driver, InMemDriver
+from unittest import TestCase, skipIf
+from contracting.db.driver import Driver, InMemDriver, SQLiteDriver, LMDBDriver, lmdb
+from contracting.db.encoder import CODEC_BINARY, BINARY_MAGIC
+import tempfile
 import random
+import os
 
 
 class TestDriver(TestCase):
@@ -250,6 +253,95 @@ class TestDriver(TestCase):
 
         self.assertListEqual(keys, got_keys)
 
+    def test_set_many_sets_and_deletes(self):
+        self.d.set('b', 'b')
+
+        self.d.set_many({
+            'a': 'a',
+            'b': None,
+            'c': {'x': 1}
+        })
+
+        self.assertEqual(self.d.get('a'), 'a')
+        self.assertIsNone(self.d.get('b'))
+        self.assertDictEqual(self.d.get('c'), {'x': 1})
+
+    def test_set_many_splits_writes_into_batches(self):
+        self.d.batch_size = 3
+
+        writes = {'k{}'.format(i): i for i in range(10)}
+        self.d.set_many(writes)
+
+        for k, v in writes.items():
+            self.assertEqual(self.d.get(k), v)
+
+    def test_get_many_returns_none_for_missing_keys(self):
+        self.d.set('a', 1)
+        self.d.set('b', 2)
+
+        self.assertDictEqual(self.d.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2, 'c': None})
+
+    def test_iter_treats_prefix_literally(self):
+        self.d.set('con.a', 1)
+        self.d.set('conXa', 2)
+        self.d.set('con.b', 3)
+        self.d.set('con', 4)
+
+        self.assertListEqual(self.d.iter(prefix='con.'), ['con.a', 'con.b'])
+
+    def test_delete_prefix_deletes_only_the_range(self):
+        for k in ['con', 'con.a', 'con.b', 'conXa', 'coo']:
+            self.d.set(k, k)
+
+        self.d.delete_prefix('con.')
+
+        self.assertListEqual(self.d.keys(), ['con', 'conXa', 'coo'])
+        self.assertIsNone(self.d.get('con.a'))
+
+    def test_iter_start_after_continues_from_key(self):
+        for k in ['con.a', 'con.b', 'con.c', 'con.d', 'coo']:
+            self.d.set(k, k)
+
+        self.assertListEqual(self.d.iter(prefix='con.', start_after='con.b'), ['con.c', 'con.d'])
+        self.assertListEqual(self.d.iter(prefix='con.', length=1, start_after='con.a'), ['con.b'])
+        self.assertListEqual(self.d.iter(prefix='con.', start_after='co'), ['con.a', 'con.b', 'con.c', 'con.d'])
+        self.assertListEqual(self.d.iter(prefix='con.', start_after='con.d'), [])
+
+    def test_migrate_codec_rewrites_values_in_binary(self):
+        self.d.set('a', {'x': [1, 2]})
+        self.d.set('b', 'b')
+
+        self.d.migrate_codec(CODEC_BINARY)
+
+        self.assertDictEqual(self.d.get('a'), {'x': [1, 2]})
+        self.assertEqual(self.d.get('b'), 'b')
+        self.assertEqual(self.d.db.find_one({'_id': 'b'})['v'][:1], BINARY_MAGIC)
+
+    def test_migrate_codec_uses_batch_size_of_driver(self):
+        for i in range(5):
+            self.d.set('k{}'.format(i), i)
+
+        batches = []
+        get_many = self.d.get_many
+
+        def recording_get_many(keys):
+            batches.append(len(keys))
+            return get_many(keys)
+
+        self.d.get_many = recording_get_many
+
+        self.d.batch_size = 2
+        self.d.migrate_codec(CODEC_BINARY)
+        self.assertListEqual(batches, [2, 2, 1])
+
+        batches.clear()
+        self.d.batch_size = 0
+        self.d.migrate_codec(CODEC_BINARY)
+        self.assertListEqual(batches, [5])
+
+        for i in range(5):
+            self.assertEqual(self.d.get('k{}'.format(i)), i)
+
 
 class TestInMemDriver(TestCase):
     # Flush this sucker every test
@@ -497,3 +589,192 @@ class TestInMemDriver(TestCase):
         got_keys = self.d.keys()
 
         self.assertListEqual(keys, got_keys)
+
+    def test_set_many_sets_and_deletes(self):
+        self.d.set('b', 'b')
+
+        self.d.set_many({
+            'a': 'a',
+            'b': None,
+            'c': {'x': 1}
+        })
+
+        self.assertEqual(self.d.get('a'), 'a')
+        self.assertIsNone(self.d.get('b'))
+        self.assertDictEqual(self.d.get('c'), {'x': 1})
+
+    def test_get_many_returns_none_for_missing_keys(self):
+        self.d.set('a', 1)
+        self.d.set('b', 2)
+
+        self.assertDictEqual(self.d.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2, 'c': None})
+
+    def test_iter_treats_prefix_literally(self):
+        self.d.set('con.a', 1)
+        self.d.set('conXa', 2)
+        self.d.set('con.b', 3)
+        self.d.set('con', 4)
+
+        self.assertListEqual(self.d.iter(prefix='con.'), ['con.a', 'con.b'])
+
+    def test_delete_prefix_deletes_only_the_range(self):
+        for k in ['con', 'con.a', 'con.b', 'conXa', 'coo']:
+            self.d.set(k, k)
+
+        self.d.delete_prefix('con.')
+
+        self.assertListEqual(self.d.keys(), ['con', 'conXa', 'coo'])
+        self.assertIsNone(self.d.get('con.a'))
+
+    def test_iter_start_after_continues_from_key(self):
+        for k in ['con.a', 'con.b', 'con.c', 'con.d', 'coo']:
+            self.d.set(k, k)
+
+        self.assertListEqual(self.d.iter(prefix='con.', start_after='con.b'), ['con.c', 'con.d'])
+        self.assertListEqual(self.d.iter(prefix='con.', length=1, start_after='con.a'), ['con.b'])
+        self.assertListEqual(self.d.iter(prefix='con.', start_after='co'), ['con.a', 'con.b', 'con.c', 'con.d'])
+        self.assertListEqual(self.d.iter(prefix='con.', start_after='con.d'), [])
+
+    def test_iter_skips_deleted_keys(self):
+        self.d.set('b1', 1)
+        self.d.set('b2', 2)
+        self.d.set('b3', 3)
+
+        self.d.delete('b2')
+        self.d.delete('b4')
+
+        self.assertListEqual(self.d.iter(prefix='b'), ['b1', 'b3'])
+        self.assertListEqual(self.d.keys(), ['b1', 'b3'])
+
+    def test_migrate_codec_rewrites_values_in_binary(self):
+        self.d.set('a', {'x': [1, 2]})
+        self.d.set('b', 'b')
+
+        self.d.migrate_codec(CODEC_BINARY)
+
+        self.assertDictEqual(self.d.get('a'), {'x': [1, 2]})
+        self.assertEqual(self.d.get('b'), 'b')
+        self.assertEqual(self.d.db[b'b'][:1], BINARY_MAGIC)
+
+
+class EmbeddedDriverTests:
+    def test_get_set(self):
+        self.d.set('b', 'a')
+        self.assertEqual(self.d.get('b'), 'a')
+
+    def test_delete(self):
+        self.d.set('b', 'a')
+        self.d.delete('b')
+        self.assertIsNone(self.d.get('b'))
+
+    def test_set_none_deletes(self):
+        self.d.set('t', 123)
+        self.d.set('t', None)
+        self.assertIsNone(self.d.get('t'))
+
+    def test_set_object_returns_properly(self):
+        thing = {
+            'a': 123,
+            'b': False,
+            'x': None
+        }
+
+        self.d.set('thing', thing)
+        self.assertDictEqual(self.d.get('thing'), thing)
+
+    def test_key_error_if_getitem_doesnt_exist(self):
+        with self.assertRaises(KeyError):
+            print(self.d['thing'])
+
+    def test_iter_is_ordered_range_scan(self):
+        keys = ['con.b', 'con.a', 'conXa', 'con', 'con.c', 'coo']
+        random.shuffle(keys)
+
+        for k in keys:
+            self.d.set(k, k)
+
+        self.assertListEqual(self.d.iter(prefix='con.'), ['con.a', 'con.b', 'con.c'])
+        self.assertListEqual(self.d.iter(prefix='con.', length=2), ['con.a', 'con.b'])
+        self.assertListEqual(self.d.keys(), sorted(keys))
+
+    def test_delete_prefix_deletes_only_the_range(self):
+        for k in ['con', 'con.a', 'con.b', 'conXa', 'coo']:
+            self.d.set(k, k)
+
+        self.d.delete_prefix('con.')
+
+        self.assertListEqual(self.d.keys(), ['con', 'conXa', 'coo'])
+        self.assertIsNone(self.d.get('con.a'))
+
+    def test_iter_start_after_continues_from_key(self):
+        for k in ['con.a', 'con.b', 'con.c', 'con.d', 'coo']:
+            self.d.set(k, k)
+
+        self.assertListEqual(self.d.iter(prefix='con.', start_after='con.b'), ['con.c', 'con.d'])
+        self.assertListEqual(self.d.iter(prefix='con.', length=1, start_after='con.a'), ['con.b'])
+        self.assertListEqual(self.d.iter(prefix='con.', start_after='co'), ['con.a', 'con.b', 'con.c', 'con.d'])
+        self.assertListEqual(self.d.iter(prefix='con.', start_after='con.bb'), ['con.c', 'con.d'])
+
+    def test_iter_start_after_the_prefix_itself(self):
+        for k in ['con', 'con.a', 'coo']:
+            self.d.set(k, k)
+
+        prefix = 'con'
+        self.assertListEqual(self.d.iter(prefix=prefix, start_after=prefix), ['con.a'])
+
+    def test_set_many_sets_and_deletes(self):
+        self.d.set('b', 'b')
+
+        self.d.set_many({
+            'a': 'a',
+            'b': None,
+            'c': {'x': 1}
+        })
+
+        self.assertDictEqual(self.d.get_many(['a', 'b', 'c']), {'a': 'a', 'b': None, 'c': {'x': 1}})
+
+    def test_flush_removes_everything(self):
+        self.d.set('a', 1)
+        self.d.set('b', 2)
+
+        self.d.flush()
+
+        self.assertListEqual(self.d.keys(), [])
+
+    def test_migrate_codec_rewrites_values_in_binary(self):
+        self.d.set('a', {'x': [1, 2]})
+        self.d.set('b', 'b')
+
+        self.d.migrate_codec(CODEC_BINARY)
+
+        self.assertDictEqual(self.d.get('a'), {'x': [1, 2]})
+        self.assertEqual(self.d.get('b'), 'b')
+
+
+class TestSQLiteDriver(EmbeddedDriverTests, TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.d = SQLiteDriver(filename=os.path.join(self.dir.name, 'state.db'))
+
+    def tearDown(self):
+        self.d.db.close()
+        self.dir.cleanup()
+
+    def test_get_many_splits_into_batches(self):
+        self.d.batch_size = 3
+
+        writes = {'k{}'.format(i): i for i in range(10)}
+        self.d.set_many(writes)
+
+        self.assertDictEqual(self.d.get_many(list(writes.keys())), writes)
+
+
+@skipIf(lmdb is None, 'lmdb is not installed.')
+class TestLMDBDriver(EmbeddedDriverTests, TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.d = LMDBDriver(path=self.dir.name, map_size=1024 * 1024 * 16)
+
+    def tearDown(self):
+        self.d.env.close()
+        self.dir.cleanup()
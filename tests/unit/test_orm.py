@@ -513,6 +513,39 @@ class TestHash(TestCase):
 
         self.assertDictEqual({}, got)
 
+    def test_iter_yields_keys_and_values_in_order(self):
+        h = Hash('blah', 'scoob', driver=driver)
+
+        h['b'] = 2
+        h['a'] = 1
+        h['c'] = 3
+
+        driver.commit()
+
+        h['bb'] = 22
+        h['c'] = None
+
+        self.assertListEqual(list(h.iter()), [('a', 1), ('b', 2), ('bb', 22)])
+        self.assertListEqual(list(h.iter(limit=1, start_after='a')), [('b', 2)])
+
+    def test_iter_multihash_yields_tuples_for_remaining_dimensions(self):
+        h = Hash('blah', 'scoob', driver=driver)
+
+        h[1, 'x', 'a'] = 1
+        h[1, 'x', 'b'] = 2
+        h[1, 'y', 'a'] = 3
+        h[2, 'x', 'a'] = 4
+
+        self.assertListEqual(list(h.iter(1)), [(('x', 'a'), 1), (('x', 'b'), 2), (('y', 'a'), 3)])
+        self.assertListEqual(list(h.iter(1, start_after=('x', 'b'))), [(('y', 'a'), 3)])
+        self.assertListEqual(list(h.iter(1, 'x')), [('a', 1), ('b', 2)])
+
+    def test_iter_start_after_delimiter_illegal(self):
+        h = Hash('blah', 'scoob', driver=driver)
+
+        with self.assertRaises(AssertionError):
+            list(h.iter(start_after='a:b'))
+
 
 class TestForeignVariable(TestCase):
     def setUp(self):
@@ -236,3 +236,22 @@ def something():
 
         self.assertDictEqual(got, expected)
 
+    def test_dependencies_for_contract(self):
+        code = '''
+import currency
+import election_house
+
+I = importlib
+
+@export
+def something(name: str):
+    I.import_module('exchange')
+    I.import_module(name)
+    importlib.import_module('currency')
+        '''
+
+        compiled = self.compiler.parse_to_code(code)
+
+        got = parser.dependencies_for_contract(compiled)
+
+        self.assertListEqual(got, ['currency', 'election_house', 'exchange'])
@@ -2,6 +2,7 @@ from unittest import TestCase
 from contracting.execution import runtime
 import sys
 import psutil
+import resource
 import os
 
 
@@ -29,6 +30,52 @@ class TestRuntime(TestCase):
         runtime.rt.clean_up()
         self.assertEqual(stamps - used, stamps)
 
+    def test_tracer_sees_contract_flag_added_to_same_globals(self):
+        # Other tests leave the flag in the globals of this module, which would meter the lines of this test as well
+        if '__contract__' in globals():
+            self.addCleanup(globals().__setitem__, '__contract__', globals().pop('__contract__'))
+
+        scope = {}
+        exec('''def f():
+    a = 5
+    b = 5
+''', scope)
+
+        runtime.rt.set_up(stmps=1000, meter=True)
+        scope['f']()
+        used_without_flag = runtime.rt.tracer.get_stamp_used()
+
+        scope['__contract__'] = True
+        scope['f']()
+        used_with_flag = runtime.rt.tracer.get_stamp_used()
+
+        del scope['__contract__']
+        scope['f']()
+        used_after_removing_flag = runtime.rt.tracer.get_stamp_used()
+        runtime.rt.tracer.stop()
+
+        self.assertEqual(used_without_flag, 0)
+        self.assertGreater(used_with_flag, 0)
+        self.assertEqual(used_after_removing_flag, used_with_flag)
+
+    def test_stop_checks_memory_used_since_last_sample(self):
+        if '__contract__' not in globals():
+            self.addCleanup(globals().pop, '__contract__', None)
+
+        # Memory is metered on the growth of the peak resident size of the process, so go 200 MB past the peak so far
+        size = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - psutil.Process().memory_info().rss
+        size += 200 * 1024 * 1024
+
+        globals()['__contract__'] = True
+        runtime.rt.set_up(stmps=1000000, meter=True)
+        a = b'x' * size
+        globals()['__contract__'] = False
+
+        with self.assertRaises(AssertionError):
+            runtime.rt.tracer.stop()
+
+        self.assertFalse(runtime.rt.tracer.is_started())
+
     def test_arbitrary_modification_of_stamps_works(self):
         stamps = 1000
         sub = 500
@@ -1,5 +1,9 @@
 from unittest import TestCase
-from contracting.stdlib.bridge.hashing import sha256, sha3
+from contracting.stdlib.bridge.hashing import sha256, sha3, sha3_hex, sha3_str, sha3_bytes, sha3_many, sha256_hex, \
+    sha256_str, sha256_bytes, sha256_many
+from contracting.execution.runtime import rt
+from contracting import config
+import hashlib
 
 
 class TestHashing(TestCase):
@@ -13,4 +17,70 @@ class TestHashing(TestCase):
         secret = '842b65a7d48e3a3c3f0e9d37eaced0b2'
         _hash = 'eaf48a02d3a4bb3aeb0ecb337f6efb026ee0bbc460652510cff929de78935514'
 
-        self.assertEqual(_hash, sha256(secret))
\ No newline at end of file
+        self.assertEqual(_hash, sha256(secret))
+
+
+class TestTypedHashing(TestCase):
+    def test_sha3_guesses_hex_or_text(self):
+        self.assertEqual(sha3('abcd'), hashlib.sha3_256(b'\xab\xcd').hexdigest())
+        self.assertEqual(sha3('abc'), hashlib.sha3_256(b'abc').hexdigest())
+        self.assertEqual(sha3('hello'), hashlib.sha3_256(b'hello').hexdigest())
+        self.assertEqual(sha3(''), hashlib.sha3_256(b'').hexdigest())
+
+    def test_sha3_takes_hex_with_whitespace_like_fromhex(self):
+        self.assertEqual(sha3('ab cd'), hashlib.sha3_256(b'\xab\xcd').hexdigest())
+        self.assertEqual(sha3('ab cd x'), hashlib.sha3_256(b'ab cd x').hexdigest())
+
+    def test_sha3_only_takes_strings(self):
+        with self.assertRaises(TypeError):
+            sha3(b'abcd')
+
+    def test_typed_entry_points(self):
+        self.assertEqual(sha3_hex('abcd'), hashlib.sha3_256(b'\xab\xcd').hexdigest())
+        self.assertEqual(sha3_str('abcd'), hashlib.sha3_256(b'abcd').hexdigest())
+        self.assertEqual(sha3_bytes(b'abcd'), hashlib.sha3_256(b'abcd').hexdigest())
+
+        self.assertEqual(sha256_hex('abcd'), hashlib.sha256(b'\xab\xcd').hexdigest())
+        self.assertEqual(sha256_str('abcd'), hashlib.sha256(b'abcd').hexdigest())
+        self.assertEqual(sha256_bytes(b'abcd'), hashlib.sha256(b'abcd').hexdigest())
+
+    def test_typed_entry_points_reject_other_types(self):
+        with self.assertRaises(AssertionError):
+            sha3_hex('hello')
+
+        with self.assertRaises(AssertionError):
+            sha3_str(b'hello')
+
+        with self.assertRaises(AssertionError):
+            sha256_bytes('hello')
+
+    def test_many(self):
+        values = ['abcd', 'hello', b'abcd']
+
+        self.assertEqual(sha3_many(values), [sha3('abcd'), sha3('hello'), sha3_bytes(b'abcd')])
+        self.assertEqual(sha256_many(values), [sha256('abcd'), sha256('hello'), sha256_bytes(b'abcd')])
+
+    def test_hashes_are_charged_when_metered(self):
+        rt.set_up(stmps=1000000, meter=True)
+        try:
+            sha3_bytes(b'abcd')
+            single = rt.tracer.get_stamp_used()
+
+            sha3_many([b'abcd', b'abcd'])
+            both = rt.tracer.get_stamp_used() - single
+        finally:
+            rt.clean_up()
+
+        self.assertEqual(single, config.HASH_COST + 4 * config.HASH_COST_PER_BYTE)
+        self.assertEqual(both, 2 * single)
+
+    def test_sha3_and_sha256_are_not_charged(self):
+        rt.set_up(stmps=1000000, meter=True)
+        try:
+            sha3('abcd')
+            sha256('abcd')
+            used = rt.tracer.get_stamp_used()
+        finally:
+            rt.clean_up()
+
+        self.assertEqual(used, 0)
@@ -258,3 +258,25 @@ class TestTimedelta(TestCase):
 
         self.assertEqual(t.days, 15)
         self.assertEqual(t.hours, 364)
+
+    def test_timedelta_is_hashable(self):
+        self.assertEqual(hash(Timedelta(days=1)), hash(Timedelta(hours=24)))
+        self.assertEqual(len({Timedelta(days=1), Timedelta(hours=24), SECONDS}), 2)
+
+    def test_raw_seconds_of_arithmetic(self):
+        t = Timedelta(days=2, seconds=30) - Timedelta(days=3)
+
+        self.assertEqual(t.seconds, -86370)
+        self.assertEqual(type(t.seconds), int)
+
+    def test_fraction_of_a_second(self):
+        self.assertEqual(Timedelta(seconds=1.5).seconds, 1.5)
+
+    def test_seconds_keep_the_type_of_the_arguments(self):
+        self.assertEqual(Timedelta(hours=1.5).seconds, 5400.0)
+        self.assertEqual(type(Timedelta(hours=1.5).seconds), float)
+        self.assertEqual(type(Timedelta(hours=2).seconds), int)
+
+    def test_has_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            DAYS.x = 1